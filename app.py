@@ -1,16 +1,34 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, current_app, has_app_context, jsonify, request
 from flask_cors import CORS 
-import MySQLdb
 import os
 import secrets
 import string
 import datetime
+import threading
+import time
+import csv
+import io
+import json
+import queue
+import zlib
 
 import smtplib
+import sqlite3
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
+import archive
+import circuit
+import events
+import rate_limit as rate_limiter
+import schedule
+import shards
+import traffic
+from rate_limit import rate_limit
+from repository import (AdminRepo, BookingRepo, LockConflict, OccupancyRepo, OtpRepo, SessionRepo, month_range,
+                        to_date, to_time)
+
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 from functools import wraps
@@ -19,39 +37,233 @@ import bcrypt
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
-
-# Configuration for MySQL connection
-MYSQL_HOST = os.getenv('MYSQL_HOST')
-MYSQL_USER = os.getenv('MYSQL_USER')
-MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
-MYSQL_DB = os.getenv('MYSQL_DB')
-MYSQL_PORT = int(os.getenv('MYSQL_PORT'))
-
-# Email configuration
-EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
-EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
-EMAIL_USER = os.getenv('EMAIL_USER')
-EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
-
-# JWT Configuration
-JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')  # Use environment variable in production
-JWT_EXPIRATION_HOURS = 24
+api = Blueprint('api', __name__)
+
+def load_config():
+    # Settings are read when the app is created rather than at import time, so
+    # importing this module never fails on a missing variable or touches the network
+    return {
+        # Configuration for MySQL connection
+        'MYSQL_HOST': os.getenv('MYSQL_HOST'),
+        'MYSQL_USER': os.getenv('MYSQL_USER'),
+        'MYSQL_PASSWORD': os.getenv('MYSQL_PASSWORD'),
+        'MYSQL_DB': os.getenv('MYSQL_DB'),
+        'MYSQL_PORT': int(os.getenv('MYSQL_PORT', '3306')),
+        # 'mysqlclient' (default) or the pure-Python 'mysql-connector'
+        'MYSQL_DRIVER': os.getenv('MYSQL_DRIVER', 'mysqlclient'),
+
+        # DB_BACKEND=sqlite runs against a local SQLite file (booking_system.sqlite.sql)
+        'DB_BACKEND': os.getenv('DB_BACKEND', 'mysql'),
+        'SQLITE_PATH': os.getenv('SQLITE_PATH', 'booking_system.db'),
+
+        # Fail fast when the database is down, see circuit.py
+        'DB_CONNECT_TIMEOUT_SECONDS': int(os.getenv('DB_CONNECT_TIMEOUT_SECONDS', '3')),
+        'DB_QUERY_TIMEOUT_SECONDS': int(os.getenv('DB_QUERY_TIMEOUT_SECONDS', '10')),
+        'DB_BREAKER_FAILURES': int(os.getenv('DB_BREAKER_FAILURES', '5')),
+        'DB_BREAKER_RESET_SECONDS': float(os.getenv('DB_BREAKER_RESET_SECONDS', '5')),
+        'DB_BREAKER_MAX_RESET_SECONDS': float(os.getenv('DB_BREAKER_MAX_RESET_SECONDS', '60')),
+        # Last good responses served stale while the database is down
+        'STALE_CACHE_ENTRIES': int(os.getenv('STALE_CACHE_ENTRIES', '512')),
+        'STALE_MAX_SECONDS': float(os.getenv('STALE_MAX_SECONDS', '3600')),
+
+        # Venues and the shard (database) each one lives on, see shards.py
+        'DEFAULT_VENUE': os.getenv('DEFAULT_VENUE', 'default'),
+        'DB_SHARDS': json.loads(os.getenv('DB_SHARDS') or '{}'),
+        'VENUE_SHARDS': json.loads(os.getenv('VENUE_SHARDS') or '{}'),
+        'SHARD_QUERY_WORKERS': int(os.getenv('SHARD_QUERY_WORKERS', '8')),
+
+        # Email configuration
+        'EMAIL_HOST': os.getenv('EMAIL_HOST', 'smtp.gmail.com'),
+        'EMAIL_PORT': int(os.getenv('EMAIL_PORT', '587')),
+        'EMAIL_USER': os.getenv('EMAIL_USER'),
+        'EMAIL_PASSWORD': os.getenv('EMAIL_PASSWORD'),
+
+        # JWT Configuration
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY'),  # Use environment variable in production
+        'JWT_EXPIRATION_HOURS': 24,
+
+        # Token-bucket limits on the public write endpoints, see rate_limit.py
+        'RATE_LIMIT_ENABLED': os.getenv('RATE_LIMIT_ENABLED', '1') not in ('0', 'false', 'False'),
+        'RATE_LIMIT_STORAGE_URL': os.getenv('RATE_LIMIT_STORAGE_URL'),
+        # RATE_LIMIT_TRUST_PROXY=1 is the older spelling of one trusted proxy
+        'RATE_LIMIT_TRUSTED_PROXIES': int(os.getenv(
+            'RATE_LIMIT_TRUSTED_PROXIES',
+            '1' if os.getenv('RATE_LIMIT_TRUST_PROXY', '0') in ('1', 'true', 'True') else '0')),
+
+        # Seconds each worker caches a venue's schedule rules, see schedule.py
+        'SCHEDULE_CACHE_SECONDS': float(os.getenv('SCHEDULE_CACHE_SECONDS', '30')),
+
+        # Days ahead whose capacity is recounted in the rollups after a schedule change
+        'OCCUPANCY_REFRESH_DAYS': int(os.getenv('OCCUPANCY_REFRESH_DAYS', '365')),
+
+        # Rows fetched per chunk by the bookings export
+        'EXPORT_CHUNK_SIZE': int(os.getenv('EXPORT_CHUNK_SIZE', '1000')),
+
+        # Maximum number of changes returned by one delta-sync call
+        'CHANGES_PAGE_SIZE': int(os.getenv('CHANGES_PAGE_SIZE', '1000')),
+
+        # Availability SSE feed: keep-alive interval and streams allowed per worker.
+        # Each open stream holds a worker thread (or greenlet), so keep this below the
+        # thread count in gunicorn.conf.py to leave room for regular requests.
+        'SSE_HEARTBEAT_SECONDS': float(os.getenv('SSE_HEARTBEAT_SECONDS', '15')),
+        'SSE_MAX_SUBSCRIBERS': int(os.getenv('SSE_MAX_SUBSCRIBERS', '48')),
+        # Redis relaying events between workers, and the per-stream backlog (events.py)
+        'EVENTS_BROKER_URL': os.getenv('EVENTS_BROKER_URL'),
+        'EVENTS_QUEUE_SIZE': int(os.getenv('EVENTS_QUEUE_SIZE', '100')),
+
+        # /readyz caches its result so frequent probes don't hammer MySQL/SMTP
+        'READINESS_CACHE_SECONDS': float(os.getenv('READINESS_CACHE_SECONDS', '10')),
+        'READINESS_TIMEOUT_SECONDS': float(os.getenv('READINESS_TIMEOUT_SECONDS', '3')),
+
+        # Cold storage of archived months, written by "python maintenance.py archive"
+        'ARCHIVE_DIR': os.getenv('ARCHIVE_DIR', 'archive'),
+
+        # Redacted request log for scripts/replay.py, off unless a path is set
+        'TRAFFIC_RECORD_PATH': os.getenv('TRAFFIC_RECORD_PATH'),
+        'TRAFFIC_RECORD_SAMPLE': float(os.getenv('TRAFFIC_RECORD_SAMPLE', '1.0')),
+        # HMAC key of the pseudonyms; a random one is drawn when unset (see traffic.py)
+        'TRAFFIC_RECORD_SECRET': os.getenv('TRAFFIC_RECORD_SECRET'),
+    }
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.update(load_config())
+    if config:
+        app.config.update(config)
+    CORS(app)
+    app.register_blueprint(api)
+    schedule.configure(app.config['SCHEDULE_CACHE_SECONDS'])
+    if app.config['TRAFFIC_RECORD_PATH']:
+        app.wsgi_app = traffic.TrafficRecorder(app.wsgi_app, app.config['TRAFFIC_RECORD_PATH'],
+                                               app.config['TRAFFIC_RECORD_SAMPLE'],
+                                               app.config['TRAFFIC_RECORD_SECRET'])
+    return app
+
+def init_worker(config=None):
+    # Called from gunicorn's post_fork hook (see gunicorn.conf.py): clients are
+    # created in each worker after the fork, never in the preloaded master
+    config = config or app.config
+    rate_limiter.get_backend(config)
+    events.get_broker(config)
+    with _readiness_lock:
+        _readiness.update(checked_at=0, result=None)
+
+# Bookings export columns
+EXPORT_COLUMNS = BookingRepo.COLUMNS
 
 # Function to get a database connection
-def get_db_connection():
-    try:
-        return MySQLdb.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            passwd=MYSQL_PASSWORD,
-            db=MYSQL_DB,
-            port=MYSQL_PORT
-        )
+def get_db_connection(config=None, venue_id=None):
+    # Outside a request (e.g. maintenance.py) settings come straight from the environment
+    if config is None:
+        config = current_app.config if has_app_context() else load_config()
+    if venue_id is not None:
+        # Connect to the shard holding this venue
+        config = shards.shard_config(config, shards.venue_shard(config, venue_id))
+    # Raises DatabaseUnavailable straight away while the breaker is open
+    breaker = circuit.get_breaker(config)
+    breaker.before_call()
+    try:
+        if config['DB_BACKEND'] == 'sqlite':
+            db = sqlite3.connect(config['SQLITE_PATH'], check_same_thread=False,
+                                 timeout=config['DB_QUERY_TIMEOUT_SECONDS'], factory=circuit.SQLiteConnection)
+        elif config['MYSQL_DRIVER'] == 'mysql-connector':
+            # Optional pure-Python driver (see repository.py)
+            import mysql.connector
+            db = mysql.connector.connect(
+                host=config['MYSQL_HOST'],
+                user=config['MYSQL_USER'],
+                password=config['MYSQL_PASSWORD'],
+                database=config['MYSQL_DB'],
+                port=config['MYSQL_PORT'],
+                connection_timeout=config['DB_CONNECT_TIMEOUT_SECONDS'],
+                read_timeout=config['DB_QUERY_TIMEOUT_SECONDS'],
+                write_timeout=config['DB_QUERY_TIMEOUT_SECONDS']
+            )
+        else:
+            # Imported here so the SQLite backend works without mysqlclient installed
+            import MySQLdb
+            db = MySQLdb.connect(
+                host=config['MYSQL_HOST'],
+                user=config['MYSQL_USER'],
+                passwd=config['MYSQL_PASSWORD'],
+                db=config['MYSQL_DB'],
+                port=config['MYSQL_PORT'],
+                connect_timeout=config['DB_CONNECT_TIMEOUT_SECONDS'],
+                read_timeout=config['DB_QUERY_TIMEOUT_SECONDS'],
+                write_timeout=config['DB_QUERY_TIMEOUT_SECONDS']
+            )
     except Exception as error:
         # handle the exception
         print("An exception occurred:", error)
+        breaker.record_failure()
+        raise circuit.DatabaseUnavailable(f"Could not connect to the database: {error}",
+                                          breaker.retry_after()) from error
+    # Repositories report query failures and successes to the breaker
+    db.breaker = breaker
+    return db
+
+def venue_required(f):
+    # Resolves the venue of the request from ?venue_id= or the JSON body,
+    # falling back to DEFAULT_VENUE, and passes it to the view as venue_id
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        data = request.get_json(silent=True)
+        venue_id = request.args.get('venue_id')
+        if not venue_id and isinstance(data, dict):
+            venue_id = data.get('venue_id')
+        venue_id = venue_id or current_app.config['DEFAULT_VENUE']
+
+        if shards.venue_shard(current_app.config, venue_id) is None:
+            return jsonify({"error": f"Unknown venue {venue_id}"}), 404
+
+        return f(*args, venue_id=venue_id, **kwargs)
+
+    return decorated
+
+def database_unavailable(error, stale_key=None):
+    # While the database is down: the last good response remembered under
+    # stale_key, marked as stale, or else a fast 503 saying when to retry
+    if stale_key is not None:
+        cached = circuit.recall(stale_key, current_app.config['STALE_MAX_SECONDS'])
+        if cached is not None:
+            response, age = cached
+            return jsonify(response), 200, {'Warning': '110 - "Response is Stale"', 'Age': str(int(age))}
+    return jsonify({"error": "The booking service is temporarily unavailable, please try again shortly"}), 503, {
+        'Retry-After': str(error.retry_after)
+    }
+
+def publish_availability(db, venue_id, slots=None, month=None):
+    # Pushes the current availability of some (bkg_date, bkg_time) slots, or of
+    # a whole (year, month), to the SSE subscribers of that month. Called after
+    # the write is committed; a failure here never fails the request.
+    try:
+        sessions = SessionRepo(db, venue_id)
+        rows = []
+        if month:
+            rows.extend(sessions.availability_month(*month))
+        for bkg_date, bkg_time in set(slots or ()):
+            rows.extend(sessions.availability_slot(bkg_date, bkg_time))
+        sessions.close()
+
+        # Same {date: {time: available}} shape as /api/bookingSummary
+        deltas = {}
+        for bkg_date, bkg_time, available in rows:
+            delta = deltas.setdefault((bkg_date.year, bkg_date.month), {})
+            delta.setdefault(bkg_date.strftime('%d-%m-%Y'), {})[bkg_time[:5]] = available
+
+        broker = events.get_broker(current_app.config)
+        for (year, month_num), delta in deltas.items():
+            broker.publish(events.availability_topic(venue_id, year, month_num), 'availability', delta)
+    except Exception as e:
+        print(f"Error publishing availability: {str(e)}")
+
+def publish_resync(venue_id):
+    # Asks every availability subscriber of the venue, whatever month they
+    # watch, to refetch. Called after the write is committed.
+    try:
+        events.get_broker(current_app.config).resync(events.availability_prefix(venue_id))
+    except Exception as e:
+        print(f"Error publishing resync: {str(e)}")
 
 def generate_otp():
     # Generate a 6-digit OTP
@@ -60,10 +272,11 @@ def generate_otp():
 def send_otp_email(email, otp):
     print(email)
     print(otp)
+    config = current_app.config
     try:
         # Create message
         msg = MIMEMultipart()
-        msg['From'] = EMAIL_USER
+        msg['From'] = config['EMAIL_USER']
         msg['To'] = email
         msg['Subject'] = "Your Booking Verification Code"
 
@@ -83,20 +296,21 @@ def send_otp_email(email, otp):
         msg.attach(MIMEText(body, 'plain'))
 
         # Create SMTP session
-        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
+        server = smtplib.SMTP(config['EMAIL_HOST'], config['EMAIL_PORT'])
         server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASSWORD)
+        server.login(config['EMAIL_USER'], config['EMAIL_PASSWORD'])
 
         # Send email
         text = msg.as_string()
-        server.sendmail(EMAIL_USER, email, text)
+        server.sendmail(config['EMAIL_USER'], email, text)
         server.quit()
         return True
     except Exception as e:
         print(f"Error sending email: {str(e)}")
         return False
 
-@app.route('/api/request-otp', methods=['POST'])
+@api.route('/api/request-otp', methods=['POST'])
+@rate_limit('request_otp')
 def request_otp():
     try:
         data = request.get_json()
@@ -109,29 +323,10 @@ def request_otp():
         # Generate OTP
         otp = generate_otp()
         expiry_time = datetime.now() + timedelta(minutes=10)
-        # Store OTP in database
+        # Store OTP in database, replacing any existing OTP for this email
         db = get_db_connection()
-        cur = db.cursor()
-
-        cur.execute("SELECT 1 FROM otp_verification WHERE email = %s", (email,))
-        email_exists = cur.fetchone()
-
-        # First, invalidate any existing OTPs for this email
-        if email_exists:
-            cur.execute("""
-                UPDATE otp_verification 
-                SET otp = %s, expiry_time = %s, is_valid = 1 
-                WHERE email = %s
-            """, (otp, expiry_time, email,))
-            
-        else:
-        # Insert new OTP
-            cur.execute("""
-                INSERT INTO otp_verification 
-                (email, otp, expiry_time, is_valid) 
-                VALUES (%s, %s, %s, 1)
-            """, (email, otp, expiry_time))
-        
+        otps = OtpRepo(db)
+        otps.save(email, otp, expiry_time)
         db.commit()
 
         return jsonify({"message": "OTP update to database successfully"}), 200
@@ -146,17 +341,20 @@ def request_otp():
         #     db.rollback()
         #     return jsonify({"error": "Failed to send OTP"}), 500
 
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         if 'db' in locals():
             db.rollback()
         return jsonify({"error": str(e)}), 500
     finally:
-        if 'cur' in locals():
-            cur.close()
+        if 'otps' in locals():
+            otps.close()
         if 'db' in locals():
             db.close()
 
-@app.route('/api/verify-otp', methods=['POST'])
+@api.route('/api/verify-otp', methods=['POST'])
+@rate_limit('verify_otp')
 def verify_otp():
     try:
         data = request.get_json()
@@ -170,29 +368,10 @@ def verify_otp():
             }), 200  # Always return 200
 
         db = get_db_connection()
-        cur = db.cursor()
+        otps = OtpRepo(db)
 
-        # Check OTP validity
-        cur.execute("""
-            SELECT 1 
-            FROM otp_verification 
-            WHERE email = %s 
-                AND otp = %s 
-                AND is_valid = 1 
-                AND expiry_time > NOW()
-            LIMIT 1
-        """, (email, otp))
-
-        result = cur.fetchone()
-
-        if result:
-            # Mark OTP as used
-            cur.execute("""
-                UPDATE otp_verification 
-                SET is_valid = 0 
-                WHERE email = %s
-            """, (email,))
-            
+        # Check OTP validity and mark it as used
+        if otps.verify(email, otp, datetime.now()):
             db.commit()
             return jsonify({
                 "success": True,
@@ -204,6 +383,8 @@ def verify_otp():
                 "message": "Invalid or expired OTP"
             }), 200  # Return 200 even for invalid OTP
 
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         if 'db' in locals():
             db.rollback()
@@ -212,20 +393,78 @@ def verify_otp():
             "message": "Server error occurred"
         }), 200  # Return 200 even for server errors
     finally:
-        if 'cur' in locals():
-            cur.close()
+        if 'otps' in locals():
+            otps.close()
         if 'db' in locals():
             db.close()
             
-# Testing connection on start-up
-connection = get_db_connection()
-if connection is None:
-    print("Connection failed")
-else:
-    print("Connection successful")
-    connection.close()
-
-# @app.route('/api/bkgSession', methods=['POST'])
+# Readiness state, replaces the old connection test on start-up
+_readiness = {'checked_at': 0, 'result': None}
+_readiness_lock = threading.Lock()
+
+def check_database(config):
+    try:
+        db = get_db_connection(config)
+    except circuit.DatabaseUnavailable as e:
+        return {"ok": False, "error": str(e)}
+    try:
+        cur = db.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        db.breaker.record_success()
+        return {"ok": True}
+    except Exception as e:
+        if circuit.is_connection_error(e):
+            db.breaker.record_failure()
+        return {"ok": False, "error": str(e)}
+    finally:
+        db.close()
+
+def check_smtp():
+    config = current_app.config
+    if not config['EMAIL_USER']:
+        return {"ok": True, "skipped": "email is not configured"}
+    try:
+        server = smtplib.SMTP(config['EMAIL_HOST'], config['EMAIL_PORT'],
+                              timeout=config['READINESS_TIMEOUT_SECONDS'])
+        server.noop()
+        server.quit()
+        return {"ok": True}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+def get_readiness():
+    # Only one request per worker runs the checks; the others reuse the cached
+    # result until it is READINESS_CACHE_SECONDS old
+    with _readiness_lock:
+        now = time.monotonic()
+        if _readiness['result'] is None or now - _readiness['checked_at'] > current_app.config['READINESS_CACHE_SECONDS']:
+            config = current_app.config
+            results = shards.scatter(config, lambda shard: check_database(shards.shard_config(config, shard)))
+            checks = {"database" if shard == shards.DEFAULT_SHARD else f"database:{shard}": result
+                      for shard, result in results.items()}
+            checks["smtp"] = check_smtp()
+            _readiness['result'] = checks
+            _readiness['checked_at'] = now
+        return _readiness['result']
+
+@api.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving requests, no dependencies checked
+    return jsonify({"status": "ok"}), 200
+
+@api.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: every shard database (and SMTP when configured) is reachable
+    checks = get_readiness()
+    ready = all(check["ok"] for check in checks.values())
+    return jsonify({
+        "status": "ready" if ready else "unavailable",
+        "checks": checks
+    }), 200 if ready else 503
+
+# @api.route('/api/bkgSession', methods=['POST'])
 # def insert_bkgsession():
 #     # Retrieve data from the request
 #     data = request.get_json()
@@ -263,8 +502,9 @@ else:
 #         db.rollback()
 #         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/bkgSession', methods=['POST'])
-def insert_bkgsession():
+@api.route('/api/bkgSession', methods=['POST'])
+@venue_required
+def insert_bkgsession(venue_id):
     # Retrieve data from the request
     data = request.get_json()
     # Check if required fields are provided
@@ -275,65 +515,37 @@ def insert_bkgsession():
     # Validate inputs
     if not month or not year:
         return jsonify({"error": "month and year are required"}), 400
+    try:
+        month = int(month)
+        year = int(year)
+    except (TypeError, ValueError):
+        return jsonify({"error": "month and year must be valid numbers"}), 400
+    if not 1 <= month <= 12:
+        return jsonify({"error": "month must be between 1 and 12"}), 400
         
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
+        db = get_db_connection(venue_id=venue_id)
+        sessions = SessionRepo(db, venue_id)
         
         # Define the available booking times
         booking_times = ['09:00:00', '10:00:00', '11:00:00', '12:00:00', 
                         '13:00:00', '14:00:00', '15:00:00', '16:00:00', '17:00:00']
         
-        # Create a temporary table for storing dates
-        cur.execute("""
-            CREATE TEMPORARY TABLE temp_dates (date_value DATE);
-        """)
-        
-        # Insert dates for the entire month into temporary table
-        cur.execute("""
-            INSERT INTO temp_dates (date_value)
-            WITH RECURSIVE date_series AS (
-                SELECT DATE(CONCAT(%s,'-',%s,'-01')) AS date_value
-                UNION ALL
-                SELECT date_value + INTERVAL 1 DAY
-                FROM date_series
-                WHERE date_value < LAST_DAY(DATE(CONCAT(%s,'-',%s,'-01')))
-            )
-            SELECT date_value FROM date_series;
-        """, (year, month, year, month))
-        
-        # Create a temporary table for times
-        cur.execute("""
-            CREATE TEMPORARY TABLE temp_times (time_value TIME);
-        """)
-        
-        # Insert the booking times
-        for time_value in booking_times:
-            cur.execute("""
-                INSERT INTO temp_times (time_value) VALUES (%s);
-            """, (time_value,))
-        
-        # Insert booking sessions for each date and time combination
-        cur.execute("""
-            INSERT IGNORE INTO bkgsession (bkg_date, bkg_time, slot_limit)
-            SELECT d.date_value, t.time_value, %s
-            FROM temp_dates d
-            CROSS JOIN temp_times t;
-        """, (slot_limit,))
-        
-        # Get the number of inserted rows
-        cur.execute("SELECT COUNT(*) FROM temp_dates")
-        num_days = cur.fetchone()[0]
+        # Insert booking sessions for each date and time combination,
+        # existing sessions are kept as they are. These rows override the
+        # venue's schedule rules (see /api/admin/schedule), which need no
+        # generating at all.
+        num_days = sessions.create_month(year, month, booking_times, slot_limit)
         rows_inserted = num_days * len(booking_times)
-        
-        # Clean up temporary tables
-        cur.execute("DROP TEMPORARY TABLE IF EXISTS temp_dates")
-        cur.execute("DROP TEMPORARY TABLE IF EXISTS temp_times")
+        occupancy = OccupancyRepo(db, venue_id)
+        occupancy.refresh_capacity(*month_range(year, month))
+        occupancy.close()
         
         # Commit the transaction
         db.commit()
-        cur.close()
+        publish_availability(db, venue_id, month=(year, month))
+        sessions.close()
         db.close()
         
         # Return success response
@@ -343,14 +555,20 @@ def insert_bkgsession():
             "total_sessions_created": rows_inserted
         }), 201
         
+    except LockConflict:
+        db.rollback()
+        return jsonify({"error": "Sessions of this month are busy, please try again"}), 409
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         # Handle any errors that occur during the insertion
         if 'db' in locals():
             db.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/getBkgSession', methods=['GET'])
-def get_bkg_session():
+@api.route('/api/getBkgSession', methods=['GET'])
+@venue_required
+def get_bkg_session(venue_id):
     # Retrieve data from the request
     data = request.get_json()
     
@@ -361,48 +579,50 @@ def get_bkg_session():
     # Validate inputs
     if not month or not year:
         return jsonify({"error": "month and year are required"}), 400
+    try:
+        month = int(month)
+        year = int(year)
+    except (TypeError, ValueError):
+        return jsonify({"error": "month and year must be valid numbers"}), 400
+    if not 1 <= month <= 12:
+        return jsonify({"error": "month must be between 1 and 12"}), 400
+
+    # Served stale from the last good response while the database is down
+    stale_key = ('getBkgSession', venue_id, year, month)
 
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
-
-        # Insert booking details into the database
-        query = '''select * from bkgsession WHERE SUBSTRING(bkg_date, 6, 2) = %s AND SUBSTRING(bkg_date, 1, 4) = %s 
-                '''
-        cur.execute(query, (month, year,))
+        db = get_db_connection(venue_id=venue_id)
+        sessions = SessionRepo(db, venue_id)
 
-        data = cur.fetchall()
-        cur.close()
+        data = sessions.list_month(year, month)
+        sessions.close()
         db.close()
-        print(data)
 
-        # Process the result to convert datetime objects to strings
+        # Process the result to convert dates to strings
         booking_data = []
-        for row in data:
-            bkg_date, bkg_time, slot_limit = row
-            # Convert datetime to string if necessary
-            if isinstance(bkg_date, datetime.date):
-                bkg_date = bkg_date.isoformat()  # Convert date to ISO format string
-            if isinstance(bkg_time, datetime.timedelta):
-                bkg_time = str(bkg_time)  # Convert timedelta to string (e.g., '18:30:00')
-            
+        for bkg_date, bkg_time, slot_limit in data:
             booking_data.append({
-                "bkg_date": bkg_date,
+                "bkg_date": bkg_date.isoformat(),
                 "bkg_time": bkg_time,
                 "slot_limit": slot_limit,
             })
+        circuit.remember(stale_key, booking_data, current_app.config['STALE_CACHE_ENTRIES'])
 
         # Return success response with formatted data
         return jsonify(booking_data), 200
 
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e, stale_key)
     except Exception as e:
         # Handle any errors that occur during the insertion
-        db.rollback()
+        if 'db' in locals():
+            db.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/bookingSummary', methods=['GET'])
-def get_booking_summary():
+@api.route('/api/bookingSummary', methods=['GET'])
+@venue_required
+def get_booking_summary(venue_id):
     # Get data from query parameters instead of JSON body
     month = request.args.get('month')
     year = request.args.get('year')
@@ -417,59 +637,43 @@ def get_booking_summary():
         year = int(year)
     except ValueError:
         return jsonify({"error": "month and year must be valid numbers"}), 400
-        
+    if not 1 <= month <= 12:
+        return jsonify({"error": "month must be between 1 and 12"}), 400
+
+    # Served stale from the last good response while the database is down
+    stale_key = ('bookingSummary', venue_id, year, month)
+
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
-
-        # Query to get available slots by combining bkgsession and booking
-        query = """
-            SELECT 
-                DATE_FORMAT(bs.bkg_date, '%%d-%%m-%%Y') as formatted_date,
-                DATE_FORMAT(bs.bkg_time, '%%H:%%i') as formatted_time,
-                bs.slot_limit - COUNT(b.bkg_date) as available_slots
-            FROM 
-                bkgsession bs
-                LEFT JOIN booking b 
-                    ON bs.bkg_date = b.bkg_date 
-                    AND bs.bkg_time = b.bkg_time
-            WHERE 
-                MONTH(bs.bkg_date) = %s 
-                AND YEAR(bs.bkg_date) = %s
-            GROUP BY 
-                bs.bkg_date,
-                bs.bkg_time,
-                bs.slot_limit
-            ORDER BY 
-                bs.bkg_date,
-                bs.bkg_time;
-        """
+        db = get_db_connection(venue_id=venue_id)
+        sessions = SessionRepo(db, venue_id)
 
-        cur.execute(query, (month, year))
-        results = cur.fetchall()
+        # Available slots by combining bkgsession and booking
+        results = sessions.availability_month(year, month)
 
         # Initialize response dictionary
         response = {}
         
-        # Process results - Note that results will be tuples, not dictionaries
-        for row in results:
-            date = row[0]
-            time = row[1]
-            available = row[2]
+        # Process results as {'dd-mm-YYYY': {'HH:MM': available}}
+        for bkg_date, bkg_time, available in results:
+            date = bkg_date.strftime('%d-%m-%Y')
+            time_value = bkg_time[:5]
             
             # Initialize date entry if it doesn't exist
             if date not in response:
                 response[date] = {}
                 
             # Add available slots
-            response[date][time] = available
+            response[date][time_value] = available
         
-        cur.close()
+        sessions.close()
         db.close()
+        circuit.remember(stale_key, response, current_app.config['STALE_CACHE_ENTRIES'])
         
         return jsonify(response), 200
         
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e, stale_key)
     except Exception as e:
         # Handle any errors
         if 'db' in locals():
@@ -477,9 +681,58 @@ def get_booking_summary():
         return jsonify({"error": str(e)}), 500
     
 
+@api.route('/api/bookingSummary/stream', methods=['GET'])
+@venue_required
+def stream_booking_summary(venue_id):
+    # Server-Sent Events feed of availability changes for one month, e.g.
+    # /api/bookingSummary/stream?year=2024&month=5. Each "availability" event
+    # carries the changed slots in the /api/bookingSummary format; "resync"
+    # means the client missed events and should refetch the summary. Open the
+    # stream before fetching the summary so no change falls in between.
+    try:
+        month = int(request.args.get('month', ''))
+        year = int(request.args.get('year', ''))
+    except ValueError:
+        return jsonify({"error": "month and year must be valid numbers"}), 400
+    if not 1 <= month <= 12:
+        return jsonify({"error": "month must be between 1 and 12"}), 400
+
+    broker = events.get_broker(current_app.config)
+    if broker.subscriber_count() >= current_app.config['SSE_MAX_SUBSCRIBERS']:
+        return jsonify({"error": "Too many open streams, please poll /api/bookingSummary"}), 503, {'Retry-After': '30'}
+
+    topic = events.availability_topic(venue_id, year, month)
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+
+    def generate():
+        # Subscribes on the first iteration, so a client that disconnects
+        # before the stream starts leaves no subscription behind; it is in
+        # place by the time the client receives the first line. No database
+        # connection is held while the stream is open.
+        subscription = broker.subscribe(topic)
+        try:
+            yield f"retry: {int(heartbeat * 1000)}\n\n"
+            while True:
+                try:
+                    message = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Comment line, keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message['data'])}\n\n"
+        finally:
+            broker.unsubscribe(topic, subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 ############# USER WISE ##################
-@app.route('/api/makeBooking', methods=['POST'])
-def make_booking():
+@api.route('/api/makeBooking', methods=['POST'])
+@rate_limit('make_booking')
+@venue_required
+def make_booking(venue_id):
     # Retrieve data from the request
     data = request.get_json()
     print(data)
@@ -498,35 +751,71 @@ def make_booking():
 
     if not phone or not email:
         return jsonify({"error": "phone and email are required"}), 400
-    
-    ref_number = generate_ref_number()
 
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
+        db = get_db_connection(venue_id=venue_id)
+        sessions = SessionRepo(db, venue_id)
+        bookings = BookingRepo(db, venue_id)
+
+        # The session must exist in the venue's schedule and have a free place;
+        # the day stays locked until commit so two bookings can't both take it
+        slot = sessions.availability_slot(bkg_date, bkg_time, for_update=True)
+        if not slot:
+            db.rollback()
+            return jsonify({"error": "There is no session at this date and time"}), 400
+        if slot[0][2] <= 0:
+            db.rollback()
+            return jsonify({"error": "This session is fully booked"}), 409
+
+        # Random references can collide; draw again until one is free
+        for _ in range(REF_NUMBER_ATTEMPTS):
+            ref_number = generate_ref_number()
+            if bookings.reserve_ref(ref_number):
+                break
+        else:
+            raise RuntimeError("Could not allocate a booking reference")
 
         # Insert booking details into the database
-        query = '''INSERT INTO booking (phone, email, bkg_date, bkg_time, family_name, table_num, ref_num)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                '''
-        cur.execute(query, (phone, email, bkg_date, bkg_time, family_name, table_num, ref_number))
+        bookings.create(ref_number, phone, email, bkg_date, bkg_time, family_name, table_num)
+        occupancy = OccupancyRepo(db, venue_id)
+        occupancy.add({bkg_date: 1})
+        bookings.record_change(ref_number, 'upsert')
 
         # Commit the transaction
         db.commit()
-        cur.close()
-        db.close()
+        publish_availability(db, venue_id, slots=[(bkg_date, bkg_time)])
 
         # Return success response
         return jsonify({"ref_number": ref_number}), 201
 
+    except ValueError:
+        if 'db' in locals():
+            db.rollback()
+        return jsonify({"error": "bkg_date must be YYYY-MM-DD and bkg_time HH:MM"}), 400
+    except LockConflict:
+        db.rollback()
+        return jsonify({"error": "This session is busy, please try again"}), 409
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         # Handle any errors that occur during the insertion
-        db.rollback()
+        if 'db' in locals():
+            db.rollback()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if 'sessions' in locals():
+            sessions.close()
+        if 'bookings' in locals():
+            bookings.close()
+        if 'occupancy' in locals():
+            occupancy.close()
+        if 'db' in locals():
+            db.close()
 
-@app.route('/api/getBooking', methods=['GET'])
-def get_booking():
+@api.route('/api/getBooking', methods=['GET'])
+@venue_required
+def get_booking(venue_id):
     # Retrieve data from the request
     ref_num = request.args.get('ref_num')
     family_name = request.args.get('family_name')
@@ -537,25 +826,12 @@ def get_booking():
 
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
+        db = get_db_connection(venue_id=venue_id)
+        bookings = BookingRepo(db, venue_id)
 
-        # Modified query to format time without seconds using TIME_FORMAT
-        query = '''
-            SELECT 
-                phone,
-                email,
-                DATE_FORMAT(bkg_date, '%%Y-%%m-%%d') as bkg_date,
-                TIME_FORMAT(bkg_time, '%%H:%%i') as bkg_time,
-                family_name,
-                table_num 
-            FROM booking 
-            WHERE ref_num = %s AND family_name = %s
-        '''
-        cur.execute(query, (ref_num, family_name,))
-
-        data = cur.fetchall()
-        cur.close()
+        # Dates come back as YYYY-MM-DD and times without seconds
+        data = bookings.get(ref_num, family_name)
+        bookings.close()
         db.close()
 
         if not data:
@@ -566,77 +842,52 @@ def get_booking():
 
         booking_data = {}
         for row in data:
-            phone, email, bkg_date, bkg_time, family_name, table_num = row
-            
             booking_data = {
                 "success": True,
-                "phone": phone,
-                "email": email,
-                "bkg_date": bkg_date,
-                "bkg_time": bkg_time,
-                "family_name": family_name,
-                "table_num": table_num
+                "phone": row["phone"],
+                "email": row["email"],
+                "bkg_date": row["bkg_date"],
+                "bkg_time": row["bkg_time"],
+                "family_name": row["family_name"],
+                "table_num": row["table_num"]
             }
 
         # Return success response with formatted data
         return jsonify(booking_data), 200
 
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         # Handle any errors that occur during the insertion
-        db.rollback()
+        if 'db' in locals():
+            db.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/getAllBookings', methods=['GET'])
-def get_all_bookings():
+@api.route('/api/getAllBookings', methods=['GET'])
+@venue_required
+def get_all_bookings(venue_id):
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
+        db = get_db_connection(venue_id=venue_id)
+        bookings_repo = BookingRepo(db, venue_id)
 
-        # Modified query to format time without seconds using TIME_FORMAT
-        query = '''
-            SELECT 
-                ref_num,
-                phone,
-                email,
-                DATE_FORMAT(bkg_date, '%Y-%m-%d') as bkg_date,
-                TIME_FORMAT(bkg_time, '%H:%i') as bkg_time,
-                family_name,
-                table_num 
-            FROM booking 
-        '''
-        cur.execute(query)
-
-        data = cur.fetchall()
-        cur.close()
+        # Dates come back as YYYY-MM-DD and times without seconds
+        bookings = bookings_repo.list_all()
+        bookings_repo.close()
         db.close()
 
-        if not data:
-            return jsonify([]), 200  # Return empty array if no bookings
-
-        bookings = []
-        for row in data:
-            ref_num, phone, email, bkg_date, bkg_time, family_name, table_num = row
-            
-            bookings.append({
-                "ref_num": ref_num,
-                "phone": phone,
-                "email": email,
-                "bkg_date": bkg_date,
-                "bkg_time": bkg_time,
-                "family_name": family_name,
-                "table_num": table_num
-            })
-
-        # Return array of bookings
+        # Return array of bookings, empty if no bookings
         return jsonify(bookings), 200
 
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         # Handle any errors that occur
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/updateBooking', methods=['PUT'])
-def update_booking():
+@api.route('/api/updateBooking', methods=['PUT'])
+@venue_required
+def update_booking(venue_id):
     # Retrieve data from the request
     data = request.get_json()
 
@@ -658,56 +909,81 @@ def update_booking():
 
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
-
-        # query = '''INSERT INTO booking (phone, email, bkg_date, bkg_time, table_num, ref_num)
-        #         VALUES (%s, %s, %s, %s, %s, %s)
-        #         '''
-        query = "UPDATE booking SET "
-        params = []
-
-        if email:
-            query += "email = %s, "
-            params.append(email)
-        if phone:
-            query += "phone = %s, "
-            params.append(phone)
-        if table_num:
-            query += "table_num = %s, "
-            params.append(table_num)
-        if bkg_date:
-            query += "bkg_date = %s, "
-            params.append(bkg_date)
-        if bkg_time:
-            query += "bkg_time = %s, "
-            params.append(bkg_time)
-        if family_name:
-            query += "family_name = %s, "
-            params.append(family_name)
-
-        query = query.rstrip(', ') # Remove the last comma and space
-        query += " WHERE ref_num = %s"
-        params.append(ref_num)
-        print(query)
-        print(params)
-            
-        # Execute the update query
-        cur.execute(query, tuple(params))
+        db = get_db_connection(venue_id=venue_id)
+        bookings = BookingRepo(db, venue_id)
+
+        # Remember the current slot so both old and new availability can be published
+        previous_slot = bookings.get_slot(ref_num)
+
+        if previous_slot and (bkg_date or bkg_time):
+            new_slot = (to_date(bkg_date or previous_slot[0]), to_time(bkg_time or previous_slot[1]))
+            if new_slot != previous_slot:
+                # Moving to another session: same check as makeBooking. End
+                # the read above so the check starts a fresh transaction, then
+                # lock both days and read the booking again under the locks.
+                db.commit()
+                sessions = SessionRepo(db, venue_id)
+                sessions.lock_days([previous_slot[0], new_slot[0]])
+                previous_slot = bookings.get_slot(ref_num)
+                slot = sessions.availability_slot(*new_slot, for_update=True)
+                if not slot:
+                    db.rollback()
+                    return jsonify({"error": "There is no session at this date and time"}), 400
+                if slot[0][2] <= 0 and new_slot != previous_slot:
+                    db.rollback()
+                    return jsonify({"error": "This session is fully booked"}), 409
+
+        # Fields that are not provided keep their current value
+        updated = bookings.update(
+            ref_num,
+            email=email or None,
+            phone=phone or None,
+            table_num=table_num or None,
+            bkg_date=bkg_date or None,
+            bkg_time=bkg_time or None,
+            family_name=family_name or None
+        )
+        if updated:
+            if previous_slot and bkg_date:
+                occupancy = OccupancyRepo(db, venue_id)
+                occupancy.add({previous_slot[0]: -1, bkg_date: 1})
+            bookings.record_change(ref_num, 'upsert')
 
         # Commit the transaction
         db.commit()
+        if previous_slot and (bkg_date or bkg_time):
+            publish_availability(db, venue_id, slots=[previous_slot, new_slot])
 
         # Return success response
         return jsonify({"message": "Booking successfully updated"}), 201
 
+    except ValueError:
+        if 'db' in locals():
+            db.rollback()
+        return jsonify({"error": "bkg_date must be YYYY-MM-DD and bkg_time HH:MM"}), 400
+    except LockConflict:
+        db.rollback()
+        return jsonify({"error": "This session is busy, please try again"}), 409
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         # Handle any errors that occur during the insertion
-        db.rollback()
+        if 'db' in locals():
+            db.rollback()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if 'sessions' in locals():
+            sessions.close()
+        if 'bookings' in locals():
+            bookings.close()
+        if 'occupancy' in locals():
+            occupancy.close()
+        if 'db' in locals():
+            db.close()
 
-@app.route('/api/cancelBooking', methods=['DELETE'])
-def cancel_booking():
+@api.route('/api/cancelBooking', methods=['DELETE'])
+@venue_required
+def cancel_booking(venue_id):
     # Retrieve params from the request
     ref_num = request.args.get('ref_num')
 
@@ -717,35 +993,48 @@ def cancel_booking():
 
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
+        db = get_db_connection(venue_id=venue_id)
+        bookings = BookingRepo(db, venue_id)
         # Check if the booking exists
-        query = '''SELECT * FROM booking WHERE ref_num = %s'''
-        cur.execute(query, (ref_num,))
-        booking = cur.fetchone()
+        booking_slot = bookings.get_slot(ref_num)
 
-        if not booking:
+        if not booking_slot:
             # If no booking found with the provided reference number
             return jsonify({"error": "Booking not found"}), 404
 
         # If the booking exists, proceed to delete it
-        delete_query = '''DELETE FROM booking WHERE ref_num = %s'''
-        cur.execute(delete_query, (ref_num,))
+        bookings.delete(ref_num)
+        occupancy = OccupancyRepo(db, venue_id)
+        occupancy.add({booking_slot[0]: -1})
+        bookings.record_change(ref_num, 'cancel')
 
         # Commit the changes
         db.commit()
-        cur.close()
-        db.close()
+        publish_availability(db, venue_id, slots=[booking_slot])
 
         # Return a success message
         return jsonify({"message": f"Booking with reference number {ref_num} has been deleted."}), 200
+    except LockConflict:
+        db.rollback()
+        return jsonify({"error": "This session is busy, please try again"}), 409
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         # Handle any errors that occur during the insertion
-        db.rollback()
+        if 'db' in locals():
+            db.rollback()
         return jsonify({"error": str(e)}), 500
+    finally:
+        if 'bookings' in locals():
+            bookings.close()
+        if 'occupancy' in locals():
+            occupancy.close()
+        if 'db' in locals():
+            db.close()
 
-@app.route('/api/getSlotLimit', methods=['GET'])
-def get_slot_limit():
+@api.route('/api/getSlotLimit', methods=['GET'])
+@venue_required
+def get_slot_limit(venue_id):
     # Retrieve data from the request
     data = request.get_json()
 
@@ -759,16 +1048,11 @@ def get_slot_limit():
 
     try:
         # Connect to the database
-        db = get_db_connection()
-        cur = db.cursor()
+        db = get_db_connection(venue_id=venue_id)
+        sessions = SessionRepo(db, venue_id)
 
-        # Insert booking details into the database
-        query = '''select slot_limit from bkgsession WHERE bkg_date = %s AND bkg_time = %s 
-                '''
-        cur.execute(query, (bkg_date, bkg_time,))
-
-        data = cur.fetchall()
-        cur.close()
+        data = sessions.slot_limit_rows(bkg_date, bkg_time)
+        sessions.close()
         db.close()
         print(data)
 
@@ -783,12 +1067,14 @@ def get_slot_limit():
         # Return success response with formatted data
         return jsonify(response), 200
 
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         # Handle any errors that occur during the insertion
-        db.rollback()
+        if 'db' in locals():
+            db.rollback()
         return jsonify({"error": str(e)}), 500
 
-
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -807,7 +1093,7 @@ def token_required(f):
 
         try:
             # Verify token
-            data = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
+            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
             # You might want to verify the admin exists in database here
             current_admin = data  # Or fetch admin from database
         except jwt.ExpiredSignatureError:
@@ -819,7 +1105,7 @@ def token_required(f):
 
     return decorated
 
-@app.route('/api/admin/login', methods=['POST'])
+@api.route('/api/admin/login', methods=['POST'])
 def admin_login():
     data = request.get_json()
     username = data.get('username')
@@ -830,11 +1116,10 @@ def admin_login():
     
     try:
         db = get_db_connection()
-        cur = db.cursor()
+        admins = AdminRepo(db)
         
         # Get admin from database
-        cur.execute('''SELECT * FROM admins WHERE username = %s''', (username,))
-        data = cur.fetchone()
+        data = admins.get_by_username(username)
         
         if not data:
             return jsonify({'message': 'Invalid credentials'}), 401
@@ -848,74 +1133,385 @@ def admin_login():
         token = jwt.encode({
             'admin_id': id,
             'username': username,
-            'exp': datetime.now() + timedelta(hours=JWT_EXPIRATION_HOURS)
-        }, JWT_SECRET_KEY)
+            'exp': datetime.now() + timedelta(hours=current_app.config['JWT_EXPIRATION_HOURS'])
+        }, current_app.config['JWT_SECRET_KEY'])
         
         return jsonify({
             'token': token,
             'message': 'Login successful'
         })
         
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         print(f"Login error: {e}")  # Log the error for debugging
         return jsonify({'message': 'An error occurred during login'}), 500
     finally:
-        if 'cur' in locals():
-            cur.close()
+        if 'admins' in locals():
+            admins.close()
         if 'db' in locals():
             db.close()
 
 # Protected Admin Route Example
-@app.route('/api/admin/bookings', methods=['GET'])
+@api.route('/api/admin/bookings', methods=['GET'])
 @token_required
 def get_admin_bookings(current_admin):
+    # Lists bookings of every venue, or of one with ?venue_id=. Each shard is
+    # queried in parallel and the results are merged by date and time.
+    config = current_app.config
+    venue_id = request.args.get('venue_id')
+    if venue_id and shards.venue_shard(config, venue_id) is None:
+        return jsonify({"error": f"Unknown venue {venue_id}"}), 404
+
+    # Months that have been moved to cold storage, e.g. ?archived_months=2024-01,2024-02
     try:
-        db = get_db_connection()
-        cur = db.cursor()
+        months = [archive.month_key(m) for m in request.args.get('archived_months', '').split(',') if m.strip()]
+    except ValueError:
+        return jsonify({"error": "archived_months must be a comma separated list of YYYY-MM"}), 400
 
-        # Modified query to match getAllBookings structure
-        query = '''
-            SELECT 
-                ref_num,
-                phone,
-                email,
-                DATE_FORMAT(bkg_date, '%Y-%m-%d') as bkg_date,
-                TIME_FORMAT(bkg_time, '%H:%i') as bkg_time,
-                family_name,
-                table_num 
-            FROM booking 
-        '''
-        cur.execute(query)
-
-        data = cur.fetchall()
-        
-        if not data:
-            return jsonify([]), 200  # Return empty array if no bookings
+    def list_shard(shard):
+        db = get_db_connection(shards.shard_config(config, shard))
+        try:
+            # Same structure as getAllBookings
+            bookings_repo = BookingRepo(db, venue_id)
+            bookings = bookings_repo.list_all()
+            bookings_repo.close()
+        finally:
+            db.close()
 
-        bookings = []
-        for row in data:
-            ref_num, phone, email, bkg_date, bkg_time, family_name, table_num = row
-            
-            bookings.append({
-                "ref_num": ref_num,
-                "phone": phone,
-                "email": email,
-                "bkg_date": bkg_date,
-                "bkg_time": bkg_time,
-                "family_name": family_name,
-                "table_num": table_num
-            })
+        # Archived rows are returned in the same shape, flagged as archived
+        for month in months:
+            for row in archive.read_month('booking', month, archive.shard_dir(shard, config['ARCHIVE_DIR'])):
+                row_venue = row.get('venue_id', config['DEFAULT_VENUE'])
+                if venue_id and row_venue != venue_id:
+                    continue
+                bookings.append({
+                    "ref_num": row['ref_num'],
+                    "phone": row['phone'],
+                    "email": row['email'],
+                    "bkg_date": row['bkg_date'],
+                    "bkg_time": row['bkg_time'][:5],
+                    "family_name": row['family_name'],
+                    "table_num": row['table_num'],
+                    "venue_id": row_venue,
+                    "archived": True
+                })
+        return bookings
 
+    try:
+        target = [shards.venue_shard(config, venue_id)] if venue_id else None
+        results = shards.scatter(config, list_shard, target)
+        bookings = sorted((booking for rows in results.values() for booking in rows),
+                          key=lambda b: (b['bkg_date'], b['bkg_time'], b['venue_id'], b['ref_num']))
         return jsonify(bookings), 200
 
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'cur' in locals():
+            
+@api.route('/api/admin/bookings/export', methods=['GET'])
+@token_required
+@venue_required
+def export_bookings(current_admin, venue_id):
+    # e.g. /api/admin/bookings/export?from=2024-01-01&to=2024-12-31&format=csv&status=past&gzip=1
+    export_format = request.args.get('format', 'csv')
+    status = request.args.get('status', 'all')
+    compress = request.args.get('gzip', '0') in ('1', 'true')
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    if status not in ('all', 'upcoming', 'past'):
+        return jsonify({"error": "status must be all, upcoming or past"}), 400
+    if not request.args.get('from') or not request.args.get('to'):
+        return jsonify({"error": "from and to are required"}), 400
+
+    try:
+        date_from = datetime.strptime(request.args.get('from'), '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.args.get('to'), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({"error": "from and to must be dates in YYYY-MM-DD format"}), 400
+
+    try:
+        db = get_db_connection(venue_id=venue_id)
+        # Unbuffered server-side cursor: rows are pulled from the database
+        # chunk by chunk as the response is written instead of loaded up front
+        cur = BookingRepo(db, venue_id).stream_range(date_from, date_to, status)
+    except circuit.DatabaseUnavailable as e:
+        if 'db' in locals():
+            db.close()
+        return database_unavailable(e)
+    except Exception as e:
+        if 'db' in locals() and db is not None:
+            db.close()
+        return jsonify({"error": str(e)}), 500
+
+    def encode(rows):
+        bookings = [BookingRepo.to_dict(row) for row in rows]
+        if export_format == 'ndjson':
+            return ''.join(json.dumps(booking, separators=(',', ':')) + '\n'
+                           for booking in bookings).encode()
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([booking[col] for col in EXPORT_COLUMNS] for booking in bookings)
+        return buffer.getvalue().encode()
+
+    def generate():
+        # wbits=31 produces a gzip container rather than a raw zlib stream
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        try:
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerow(EXPORT_COLUMNS)
+                header = buffer.getvalue().encode()
+                yield compressor.compress(header) if compressor else header
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunk = encode(rows)
+                yield compressor.compress(chunk) if compressor else chunk
+            if compressor:
+                yield compressor.flush()
+        finally:
             cur.close()
+            db.close()
+
+    filename = f"bookings_{venue_id}_{date_from.isoformat()}_{date_to.isoformat()}.{export_format}"
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+
+    return Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        # Ask reverse proxies not to buffer the whole export
+        'X-Accel-Buffering': 'no'
+    })
+
+@api.route('/api/admin/bookings/changes', methods=['GET'])
+@token_required
+@venue_required
+def get_booking_changes(current_admin, venue_id):
+    # Delta sync for dashboards:
+    #   GET /api/admin/bookings/changes            -> full snapshot + version token
+    #   GET /api/admin/bookings/changes?since=<v>  -> bookings created/updated and
+    #                                                 ref_nums cancelled after <v>
+    # Pass the returned "version" as the next since. When has_more is true,
+    # call again straight away. 410 means the log was purged past the token
+    # and the client has to reload the snapshot.
+    since = request.args.get('since')
+    try:
+        since = int(since) if since is not None else None
+        page_size = current_app.config['CHANGES_PAGE_SIZE']
+        limit = min(int(request.args.get('limit', page_size)), page_size)
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+    if limit <= 0:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    try:
+        db = get_db_connection(venue_id=venue_id)
+        bookings_repo = BookingRepo(db, venue_id)
+
+        oldest, latest = bookings_repo.change_bounds()
+
+        if since is None:
+            # Read the token first: versions commit in order, so the snapshot
+            # holds at least every change up to it, and changes racing with
+            # the snapshot are simply returned again by the next delta call
+            return jsonify({
+                "version": latest or 0,
+                "has_more": False,
+                "bookings": bookings_repo.list_all(),
+                "cancelled": []
+            }), 200
+
+        # The token is no longer covered when the log was purged past it (all
+        # of it, once nothing changed for the whole retention window), and is
+        # unknown when it is ahead of the venue's latest version
+        latest = latest or 0
+        purged = since < oldest - 1 if oldest is not None else since < latest
+        if purged or since > latest:
+            return jsonify({"error": "Change log no longer covers this version, reload the full list"}), 410
+
+        rows = bookings_repo.changes_since(since, limit)
+
+        # Several changes to one booking collapse into its current state; a
+        # booking that no longer exists is reported as cancelled
+        changes = {}
+        for version, ref_num, booking in rows:
+            changes[ref_num] = booking
+
+        return jsonify({
+            "version": rows[-1][0] if rows else since,
+            "has_more": len(rows) == limit,
+            "bookings": [b for b in changes.values() if b is not None],
+            "cancelled": [ref for ref, b in changes.items() if b is None]
+        }), 200
+
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'bookings_repo' in locals():
+            bookings_repo.close()
         if 'db' in locals():
             db.close()
-            
+
+@api.route('/api/admin/occupancy', methods=['GET'])
+@token_required
+@venue_required
+def get_occupancy(current_admin, venue_id):
+    # Utilisation heatmap, e.g. /api/admin/occupancy?from=2024-01-01&to=2024-12-31&grain=week
+    # Served from the occupancy rollups with one indexed read; month totals
+    # are summed from the daily rows.
+    grain = request.args.get('grain', 'day')
+    if grain not in ('day', 'week', 'month'):
+        return jsonify({"error": "grain must be day, week or month"}), 400
+    if not request.args.get('from') or not request.args.get('to'):
+        return jsonify({"error": "from and to are required"}), 400
+
+    try:
+        date_from = datetime.strptime(request.args.get('from'), '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.args.get('to'), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({"error": "from and to must be dates in YYYY-MM-DD format"}), 400
+
+    try:
+        db = get_db_connection(venue_id=venue_id)
+        occupancy = OccupancyRepo(db, venue_id)
+
+        if grain == 'week':
+            rows = occupancy.weeks(date_from, date_to)
+        else:
+            rows = occupancy.days(date_from, date_to)
+
+        if grain == 'month':
+            months = {}
+            for day, booked, capacity in rows:
+                total = months.setdefault(day.replace(day=1), [0, 0])
+                total[0] += booked
+                total[1] += capacity
+            rows = [(month, booked, capacity) for month, (booked, capacity) in sorted(months.items())]
+
+        return jsonify({
+            "venue_id": venue_id,
+            "grain": grain,
+            "periods": [{
+                "start": start.isoformat(),
+                "booked": booked,
+                "capacity": capacity,
+                "utilisation": round(booked / capacity, 4) if capacity else None
+            } for start, booked, capacity in rows]
+        }), 200
+
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if 'occupancy' in locals():
+            occupancy.close()
+        if 'db' in locals():
+            db.close()
+
+@api.route('/api/admin/schedule', methods=['GET', 'PUT'])
+@token_required
+@venue_required
+def admin_schedule(current_admin, venue_id):
+    # The venue's session rules and closures, see schedule.py. PUT replaces
+    # whichever of the two lists it is given, e.g.
+    #   {"rules": [{"weekdays": [0, 1, 2, 3, 4], "times": ["09:00", "10:00"], "slot_limit": 5},
+    #              {"weekdays": [5], "times": ["10:00"], "slot_limit": 8,
+    #               "valid_from": "2024-12-01", "valid_to": "2024-12-31"}],
+    #    "exceptions": [{"date": "2024-12-25", "reason": "Christmas"},
+    #                   {"date": "2024-12-24", "time": "17:00", "reason": "Early close"}]}
+    # Weekdays run from 0 (Monday) to 6; an exception without a time closes the day.
+    if request.method == 'PUT':
+        data = request.get_json() or {}
+        try:
+            rules = []
+            for rule in data.get('rules', []):
+                slot_limit = int(rule.get('slot_limit', 5))
+                valid_from = rule.get('valid_from') and datetime.strptime(rule['valid_from'], '%Y-%m-%d').date()
+                valid_to = rule.get('valid_to') and datetime.strptime(rule['valid_to'], '%Y-%m-%d').date()
+                if slot_limit < 0 or not rule.get('weekdays') or not rule.get('times'):
+                    raise ValueError
+                for weekday in rule['weekdays']:
+                    if int(weekday) not in range(7):
+                        raise ValueError
+                    for bkg_time in rule['times']:
+                        bkg_time = datetime.strptime(bkg_time[:5], '%H:%M').time()
+                        rules.append((int(weekday), bkg_time, slot_limit, valid_from or None, valid_to or None))
+            exceptions = []
+            for exception in data.get('exceptions', []):
+                exc_date = datetime.strptime(exception['date'], '%Y-%m-%d').date()
+                bkg_time = exception.get('time') and datetime.strptime(exception['time'][:5], '%H:%M').time()
+                exceptions.append((exc_date, bkg_time or None, exception.get('reason')))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "rules need weekdays (0-6), times (HH:MM) and a slot_limit of 0 or more, "
+                                     "exceptions need a date (YYYY-MM-DD)"}), 400
+
+    try:
+        db = get_db_connection(venue_id=venue_id)
+        sessions = SessionRepo(db, venue_id)
+
+        if request.method == 'PUT':
+            if 'rules' in data:
+                sessions.replace_rules(rules)
+            if 'exceptions' in data:
+                sessions.replace_exceptions(exceptions)
+            today = datetime.now().date()
+            occupancy = OccupancyRepo(db, venue_id)
+            occupancy.refresh_capacity(today, today + timedelta(days=current_app.config['OCCUPANCY_REFRESH_DAYS']))
+            occupancy.close()
+            db.commit()
+            # Only once committed, so no request caches the old rules again
+            # or the new ones before they are visible
+            schedule.invalidate(venue_id)
+            # Rules and closures can change any month of the venue
+            publish_resync(venue_id)
+
+        # One entry per weekday and rule, in the same format PUT accepts
+        grouped = {}
+        for weekday, bkg_time, slot_limit, valid_from, valid_to in sessions.rule_rows():
+            key = (weekday, slot_limit, valid_from, valid_to)
+            grouped.setdefault(key, []).append(bkg_time[:5])
+        rules = [{
+            "weekdays": [weekday],
+            "times": sorted(times),
+            "slot_limit": slot_limit,
+            "valid_from": valid_from.isoformat() if valid_from else None,
+            "valid_to": valid_to.isoformat() if valid_to else None
+        } for (weekday, slot_limit, valid_from, valid_to), times in grouped.items()]
+        rules.sort(key=lambda rule: (rule["weekdays"], rule["valid_from"] or '', rule["slot_limit"]))
+        exceptions = [{
+            "date": exc_date.isoformat(),
+            "time": bkg_time[:5] if bkg_time else None,
+            "reason": reason
+        } for exc_date, bkg_time, reason in sessions.exception_rows()]
+
+        return jsonify({"venue_id": venue_id, "rules": rules, "exceptions": exceptions}), 200
+
+    except LockConflict:
+        db.rollback()
+        return jsonify({"error": "Sessions of this venue are busy, please try again"}), 409
+    except circuit.DatabaseUnavailable as e:
+        return database_unavailable(e)
+    except Exception as e:
+        if 'db' in locals():
+            db.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if 'sessions' in locals():
+            sessions.close()
+        if 'db' in locals():
+            db.close()
+
+REF_NUMBER_ATTEMPTS = 10
+
 def generate_ref_number(length=6):
     # Create a set of characters (uppercase, lowercase, and digits)
     characters = string.ascii_letters + string.digits
@@ -923,5 +1519,9 @@ def generate_ref_number(length=6):
     return ref_number
 
 
+# WSGI entry point for `gunicorn app:app`; creating it only builds the Flask
+# object, resources are opened lazily per request or in init_worker()
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True)
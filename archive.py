@@ -0,0 +1,130 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+# Cold storage for booking history.
+#
+# Each archived month of a table is one gzipped NDJSON file:
+#   <archive_dir>/<table>/<YYYY-MM>.ndjson.gz
+# and <archive_dir>/manifest.json records what has been archived and dropped
+# from the database:
+#   {"booking": {"2024-01": {"file": "booking/2024-01.ndjson.gz",
+#                            "rows": 123, "sha256": "...", "archived_at": "..."}}}
+# archive_dir is ARCHIVE_DIR from the app config; venue shards other than the
+# default one use ARCHIVE_DIR/<shard>/ instead.
+MANIFEST_NAME = 'manifest.json'
+
+
+def month_key(value):
+    # Accepts 'YYYY-MM', a date or a (year, month) tuple and returns 'YYYY-MM'
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return f"{value.year:04d}-{value.month:02d}"
+    if isinstance(value, tuple):
+        return f"{int(value[0]):04d}-{int(value[1]):02d}"
+    year, month = str(value).split('-')[:2]
+    if not 1 <= int(month) <= 12:
+        raise ValueError(f"Invalid month: {value}")
+    return f"{int(year):04d}-{int(month):02d}"
+
+
+def to_json_value(value):
+    # MySQLdb returns DATE as date, TIME as timedelta and DATETIME as datetime
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        total = int(value.total_seconds())
+        return f"{total // 3600:02d}:{total % 3600 // 60:02d}:{total % 60:02d}"
+    return value
+
+
+def _atomic_write(path, write):
+    # Write to a temporary file in the same directory and rename over the
+    # target, so readers never see a half-written file
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            write(tmp)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def shard_dir(shard, archive_dir):
+    # Each venue shard archives into its own directory; the default shard
+    # keeps using ARCHIVE_DIR itself
+    if shard == 'default':
+        return archive_dir
+    return os.path.join(archive_dir, shard)
+
+
+def load_manifest(archive_dir):
+    path = os.path.join(archive_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, archive_dir):
+    path = os.path.join(archive_dir, MANIFEST_NAME)
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode()
+    _atomic_write(path, lambda f: f.write(data))
+
+
+def write_month(table, month, columns, rows, archive_dir):
+    # Writes the rows of one month and returns its manifest entry; the month
+    # is only recorded by record_month(), once its rows have left the
+    # database. rows may be any iterable of tuples (e.g. a server-side cursor).
+    month = month_key(month)
+    relative = os.path.join(table, f"{month}.ndjson.gz")
+    path = os.path.join(archive_dir, relative)
+    digest = hashlib.sha256()
+    count = 0
+
+    def write(f):
+        nonlocal count
+        with gzip.GzipFile(fileobj=f, mode='wb') as gz:
+            for row in rows:
+                record = {col: to_json_value(val) for col, val in zip(columns, row)}
+                line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+                digest.update(line)
+                gz.write(line)
+                count += 1
+
+    _atomic_write(path, write)
+    return {
+        "file": relative,
+        "rows": count,
+        "sha256": digest.hexdigest(),
+        "archived_at": datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def record_month(table, month, entry, archive_dir):
+    # Adds a month written by write_month() to the manifest, which makes the
+    # admin listing read it from the archive
+    manifest = load_manifest(archive_dir)
+    manifest.setdefault(table, {})[month_key(month)] = entry
+    save_manifest(manifest, archive_dir)
+
+
+def archived_months(table, archive_dir):
+    return sorted(load_manifest(archive_dir).get(table, {}))
+
+
+def read_month(table, month, archive_dir):
+    # Yields the archived rows of one month as dicts; nothing if not archived
+    entry = load_manifest(archive_dir).get(table, {}).get(month_key(month))
+    if not entry:
+        return
+    with gzip.open(os.path.join(archive_dir, entry['file']), 'rt') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -1,11 +1,15 @@
+-- Every venue shard (see shards.py) uses this schema; rows carry their venue_id
+-- so several venues can share one database.
 CREATE TABLE bkgsession (
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
   bkg_date DATE,
   bkg_time TIME,
   slot_limit INTEGER DEFAULT 5,
-  primary key (bkg_date, bkg_time)
+  primary key (venue_id, bkg_date, bkg_time)
  );
 
 CREATE TABLE booking (
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
   phone VARCHAR(255),
   email VARCHAR(255),
   family_name VARCHAR(255),
@@ -13,6 +17,16 @@ CREATE TABLE booking (
   bkg_time TIME NOT NULL,
   table_num INTEGER DEFAULT 1,
   ref_num VARCHAR(255) NOT NULL,
+  PRIMARY KEY (venue_id, ref_num, bkg_date),
+  INDEX idx_booking_slot (venue_id, bkg_date, bkg_time)
+);
+
+-- booking's primary key must include bkg_date for partitioning, so unique
+-- booking references are enforced here (see BookingRepo.reserve_ref)
+CREATE TABLE booking_ref (
+  ref_num VARCHAR(255) NOT NULL,
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (ref_num)
 );
 
@@ -21,5 +35,68 @@ CREATE TABLE otp_verification (
   otp VARCHAR(6),
   expiry_time DATETIME NOT NULL,
   is_valid BOOL,
-  PRIMARY KEY (email)
-);
\ No newline at end of file
+  PRIMARY KEY (email),
+  INDEX idx_otp_expiry (expiry_time)
+);
+
+CREATE TABLE booking_change (
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  version BIGINT NOT NULL,
+  ref_num VARCHAR(255) NOT NULL,
+  change_type ENUM('upsert', 'cancel') NOT NULL,
+  changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (venue_id, version),
+  INDEX idx_change_time (changed_at)
+);
+
+-- Latest change log version per venue, bumped by every booking write
+CREATE TABLE booking_sync (
+  venue_id VARCHAR(64) NOT NULL,
+  version BIGINT NOT NULL,
+  PRIMARY KEY (venue_id)
+);
+
+-- Weekly session templates and closures, see schedule.py; bkgsession rows
+-- only override them
+CREATE TABLE schedule_rule (
+  id BIGINT NOT NULL AUTO_INCREMENT,
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  weekday TINYINT NOT NULL,
+  bkg_time TIME NOT NULL,
+  slot_limit INTEGER NOT NULL DEFAULT 5,
+  valid_from DATE,
+  valid_to DATE,
+  PRIMARY KEY (id),
+  INDEX idx_rule_venue (venue_id)
+);
+
+CREATE TABLE schedule_exception (
+  id BIGINT NOT NULL AUTO_INCREMENT,
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  exc_date DATE NOT NULL,
+  bkg_time TIME,
+  reason VARCHAR(255),
+  PRIMARY KEY (id),
+  INDEX idx_exception_venue (venue_id, exc_date)
+);
+
+-- Booked places against capacity per day and per week (Monday), maintained
+-- by the booking writes, see OccupancyRepo
+CREATE TABLE occupancy_daily (
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  day DATE NOT NULL,
+  booked INTEGER NOT NULL DEFAULT 0,
+  capacity INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (venue_id, day)
+);
+
+CREATE TABLE occupancy_weekly (
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  week_start DATE NOT NULL,
+  booked INTEGER NOT NULL DEFAULT 0,
+  capacity INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (venue_id, week_start)
+);
+
+-- booking and bkgsession are partitioned by bkg_date month, run:
+--   python maintenance.py partition --months-ahead 3
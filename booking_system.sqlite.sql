@@ -0,0 +1,97 @@
+-- SQLite version of booking_system.sql for local development, tests and
+-- benchmarks (DB_BACKEND=sqlite). Dates and times are stored as ISO text.
+-- Partitioning and the maintenance.py jobs are MySQL only.
+CREATE TABLE IF NOT EXISTS bkgsession (
+  venue_id TEXT NOT NULL DEFAULT 'default',
+  bkg_date TEXT,
+  bkg_time TEXT,
+  slot_limit INTEGER DEFAULT 5,
+  PRIMARY KEY (venue_id, bkg_date, bkg_time)
+);
+
+CREATE TABLE IF NOT EXISTS booking (
+  venue_id TEXT NOT NULL DEFAULT 'default',
+  phone TEXT,
+  email TEXT,
+  family_name TEXT,
+  bkg_date TEXT NOT NULL,
+  bkg_time TEXT NOT NULL,
+  table_num INTEGER DEFAULT 1,
+  ref_num TEXT NOT NULL,
+  PRIMARY KEY (venue_id, ref_num, bkg_date)
+);
+CREATE INDEX IF NOT EXISTS idx_booking_slot ON booking (venue_id, bkg_date, bkg_time);
+
+CREATE TABLE IF NOT EXISTS booking_ref (
+  ref_num TEXT NOT NULL PRIMARY KEY,
+  venue_id TEXT NOT NULL DEFAULT 'default',
+  created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS otp_verification (
+  email TEXT,
+  otp TEXT,
+  expiry_time TEXT NOT NULL,
+  is_valid INTEGER,
+  PRIMARY KEY (email)
+);
+CREATE INDEX IF NOT EXISTS idx_otp_expiry ON otp_verification (expiry_time);
+
+CREATE TABLE IF NOT EXISTS booking_change (
+  venue_id TEXT NOT NULL DEFAULT 'default',
+  version INTEGER NOT NULL,
+  ref_num TEXT NOT NULL,
+  change_type TEXT NOT NULL CHECK (change_type IN ('upsert', 'cancel')),
+  changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (venue_id, version)
+);
+CREATE INDEX IF NOT EXISTS idx_change_time ON booking_change (changed_at);
+
+CREATE TABLE IF NOT EXISTS booking_sync (
+  venue_id TEXT PRIMARY KEY,
+  version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS schedule_rule (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  venue_id TEXT NOT NULL DEFAULT 'default',
+  weekday INTEGER NOT NULL,
+  bkg_time TEXT NOT NULL,
+  slot_limit INTEGER NOT NULL DEFAULT 5,
+  valid_from TEXT,
+  valid_to TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_rule_venue ON schedule_rule (venue_id);
+
+CREATE TABLE IF NOT EXISTS schedule_exception (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  venue_id TEXT NOT NULL DEFAULT 'default',
+  exc_date TEXT NOT NULL,
+  bkg_time TEXT,
+  reason TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_exception_venue ON schedule_exception (venue_id, exc_date);
+
+CREATE TABLE IF NOT EXISTS occupancy_daily (
+  venue_id TEXT NOT NULL DEFAULT 'default',
+  day TEXT NOT NULL,
+  booked INTEGER NOT NULL DEFAULT 0,
+  capacity INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (venue_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS occupancy_weekly (
+  venue_id TEXT NOT NULL DEFAULT 'default',
+  week_start TEXT NOT NULL,
+  booked INTEGER NOT NULL DEFAULT 0,
+  capacity INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (venue_id, week_start)
+);
+
+CREATE TABLE IF NOT EXISTS admins (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username TEXT NOT NULL UNIQUE,
+  password_hash TEXT NOT NULL,
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  last_login TEXT
+);
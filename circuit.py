@@ -0,0 +1,163 @@
+import collections
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+
+# Circuit breaker around database access.
+#
+# Each database (host/port/name, or SQLite file) gets a breaker per worker.
+# After DB_BREAKER_FAILURES consecutive connection failures or dropped/timed
+# out queries it opens: get_db_connection() then raises DatabaseUnavailable
+# straight away instead of waiting out the connect timeout, and routes answer
+# 503 with Retry-After. Once the open period has passed, one request is let
+# through as a probe (half-open); success closes the breaker, failure opens it
+# again for twice as long, up to DB_BREAKER_MAX_RESET_SECONDS. Open periods
+# are jittered so workers don't all probe a recovering server at once.
+#
+# Reads that can tolerate it (bookingSummary, getBkgSession) remember their
+# last good response and serve it, marked stale, while the database is down
+# (STALE_CACHE_ENTRIES and STALE_MAX_SECONDS in the app config).
+
+# MySQL client errors meaning the server can't be reached or stopped
+# answering: can't connect, server gone away, lost connection during a query,
+# read timeout and max_execution_time exceeded
+CONNECTION_ERROR_CODES = {2002, 2003, 2005, 2006, 2013, 2055, 3024}
+
+
+class DatabaseUnavailable(Exception):
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SQLiteConnection(sqlite3.Connection):
+    # sqlite3.Connection takes no attributes; this lets the breaker ride along
+    pass
+
+
+def error_code(error):
+    # MySQL error number of a mysqlclient or mysql-connector exception, or None
+    code = getattr(error, 'errno', None)
+    if code is None and error.args and isinstance(error.args[0], int):
+        code = error.args[0]
+    return code
+
+
+def is_connection_error(error):
+    return error_code(error) in CONNECTION_ERROR_CODES
+
+
+def database_key(config):
+    if config['DB_BACKEND'] == 'sqlite':
+        return f"sqlite:{config['SQLITE_PATH']}"
+    return f"mysql:{config['MYSQL_HOST']}:{config['MYSQL_PORT']}/{config['MYSQL_DB']}"
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_seconds=5, max_reset_seconds=60, probe_seconds=15):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.max_reset_seconds = max_reset_seconds
+        # A probe that hasn't reported back after this long is given up on
+        self.probe_seconds = probe_seconds
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.backoff = reset_seconds
+        self.open_until = 0
+        self.probe_started = None
+
+    def retry_after(self):
+        # Whole seconds until the next probe, at least 1
+        return max(1, math.ceil(self.open_until - time.monotonic()))
+
+    def before_call(self):
+        # Raises DatabaseUnavailable while open; lets one probe through at a
+        # time once the open period is over
+        if self.state == 'closed':
+            return
+        with self.lock:
+            now = time.monotonic()
+            if self.state == 'open':
+                if now < self.open_until:
+                    raise DatabaseUnavailable(f"Database {self.name} is unavailable", self.retry_after())
+                self.state = 'half-open'
+            elif self.state == 'half-open' and self.probe_started is not None \
+                    and now - self.probe_started < self.probe_seconds:
+                raise DatabaseUnavailable(f"Database {self.name} is recovering", 1)
+            self.probe_started = now
+
+    def record_success(self):
+        if self.state == 'closed' and not self.failures:
+            return
+        with self.lock:
+            if self.state != 'closed':
+                print(f"Database {self.name} is available again")
+            self.state = 'closed'
+            self.failures = 0
+            self.backoff = self.reset_seconds
+            self.probe_started = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half-open':
+                self.backoff = min(self.backoff * 2, self.max_reset_seconds)
+            elif self.failures < self.failure_threshold:
+                return
+            # Equal jitter: between half and all of the backoff
+            self.open_until = time.monotonic() + self.backoff * random.uniform(0.5, 1.0)
+            if self.state != 'open':
+                print(f"Database {self.name} is unavailable, failing fast for {self.backoff:.0f}s")
+            self.state = 'open'
+            self.probe_started = None
+
+
+_breakers = {}
+_breakers_pid = None
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(config):
+    # One breaker per database and worker process; state isn't shared across
+    # a fork
+    global _breakers, _breakers_pid
+    key = database_key(config)
+    with _breakers_lock:
+        if _breakers_pid != os.getpid():
+            _breakers = {}
+            _breakers_pid = os.getpid()
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(
+                key,
+                failure_threshold=config['DB_BREAKER_FAILURES'],
+                reset_seconds=config['DB_BREAKER_RESET_SECONDS'],
+                max_reset_seconds=config['DB_BREAKER_MAX_RESET_SECONDS'],
+                probe_seconds=config['DB_CONNECT_TIMEOUT_SECONDS'] + config['DB_QUERY_TIMEOUT_SECONDS']
+            )
+        return _breakers[key]
+
+
+_stale = collections.OrderedDict()
+_stale_lock = threading.Lock()
+
+
+def remember(key, value, max_entries=512):
+    with _stale_lock:
+        _stale[key] = (time.monotonic(), value)
+        _stale.move_to_end(key)
+        while len(_stale) > max_entries:
+            _stale.popitem(last=False)
+
+
+def recall(key, max_age=3600):
+    # (value, age in seconds) of the last good response, or None
+    with _stale_lock:
+        entry = _stale.get(key)
+    if entry is None or time.monotonic() - entry[0] > max_age:
+        return None
+    return entry[1], time.monotonic() - entry[0]
@@ -0,0 +1,160 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+# In-process publish/subscribe used by the availability SSE feed.
+#
+# Every subscriber gets its own bounded queue, so a publisher never blocks and
+# a slow client can't hold up the others: when a queue is full it is emptied
+# and the client gets a single "resync" event telling it to refetch.
+#
+# With several gunicorn workers a booking made in one worker must reach
+# subscribers connected to the others. Set EVENTS_BROKER_URL=redis://... in
+# the app config and messages are published through Redis; each worker runs
+# one listener thread that hands them to its local subscribers.
+CHANNEL_PREFIX = 'events:'
+# Backoff of the listener thread while Redis is unreachable
+RECONNECT_SECONDS = 0.5
+MAX_RECONNECT_SECONDS = 30
+
+
+class Broker:
+    def __init__(self, url=None, queue_size=100):
+        self.subscribers = {}
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.redis = None
+        if url:
+            import redis  # optional dependency, only needed across workers
+            self.redis = redis.Redis.from_url(url)
+            listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+            listener.start()
+
+    def subscribe(self, topic):
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, topic, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(topic)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[topic]
+
+    def subscriber_count(self):
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+    def publish(self, topic, event_type, data):
+        message = {"topic": topic, "type": event_type, "data": data}
+        if self.redis is not None:
+            self.redis.publish(CHANNEL_PREFIX + topic, json.dumps(message))
+        else:
+            self._dispatch(message)
+
+    def resync(self, prefix):
+        # Tells every subscriber of the topics starting with prefix to refetch,
+        # for changes too wide to send as deltas (e.g. a new schedule)
+        message = {"prefix": prefix, "type": "resync", "data": {}}
+        if self.redis is not None:
+            self.redis.publish(CHANNEL_PREFIX + prefix, json.dumps(message))
+        else:
+            self._dispatch(message)
+
+    def _dispatch(self, message):
+        if 'prefix' in message:
+            with self.lock:
+                subscribers = [(topic, s) for topic, subs in self.subscribers.items()
+                               if topic.startswith(message['prefix']) for s in subs]
+            for topic, subscription in subscribers:
+                self._resync(topic, subscription)
+            return
+        with self.lock:
+            subscribers = list(self.subscribers.get(message['topic'], ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(message)
+            except queue.Full:
+                # The client fell behind: drop its backlog and ask it to reload
+                self._resync(message['topic'], subscription)
+
+    def _resync(self, topic, subscription):
+        self._drain(subscription)
+        try:
+            subscription.put_nowait({"topic": topic, "type": "resync", "data": {}})
+        except queue.Full:
+            pass
+
+    def _resync_all(self):
+        with self.lock:
+            subscribers = [(topic, s) for topic, subs in self.subscribers.items() for s in subs]
+        for topic, subscription in subscribers:
+            self._resync(topic, subscription)
+
+    def _drain(self, subscription):
+        while True:
+            try:
+                subscription.get_nowait()
+            except queue.Empty:
+                return
+
+    def _listen(self):
+        # Runs for the life of the worker. When the Redis connection drops it
+        # reconnects with jittered exponential backoff; events published in the
+        # meantime are lost, so local subscribers are told to resync.
+        delay = RECONNECT_SECONDS
+        reconnecting = False
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(CHANNEL_PREFIX + '*')
+                if reconnecting:
+                    print("Reconnected to the events broker")
+                    self._resync_all()
+                delay = RECONNECT_SECONDS
+                reconnecting = False
+                for item in pubsub.listen():
+                    try:
+                        self._dispatch(json.loads(item['data']))
+                    except Exception as e:
+                        print(f"Error dispatching event: {str(e)}")
+            except Exception as e:
+                print(f"Lost the events broker connection, retrying in {delay:.1f}s: {str(e)}")
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            reconnecting = True
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, MAX_RECONNECT_SECONDS)
+
+
+_broker = None
+_broker_pid = None
+_broker_lock = threading.Lock()
+
+
+def get_broker(config):
+    # One broker per process, created after the fork (see init_worker in app.py)
+    global _broker, _broker_pid
+    with _broker_lock:
+        if _broker is None or _broker_pid != os.getpid():
+            _broker = Broker(config['EVENTS_BROKER_URL'], config['EVENTS_QUEUE_SIZE'])
+            _broker_pid = os.getpid()
+        return _broker
+
+
+def availability_topic(venue_id, year, month):
+    return f"{availability_prefix(venue_id)}{int(year):04d}-{int(month):02d}"
+
+
+def availability_prefix(venue_id):
+    # Common prefix of all the availability topics of a venue
+    return f"availability:{venue_id}:"
@@ -0,0 +1,22 @@
+import os
+
+# gunicorn -c gunicorn.conf.py app:app
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+
+# Threaded workers, so an open /api/bookingSummary/stream only holds a thread
+# instead of a whole sync worker. Use GUNICORN_WORKER_CLASS=gevent for many
+# more concurrent streams (and raise SSE_MAX_SUBSCRIBERS to match).
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '64'))
+
+# Importing the app is cheap and side-effect free, so it can be loaded once in
+# the master and shared copy-on-write by the workers
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def post_fork(server, worker):
+    # Per-process clients (rate limit storage, event broker, readiness cache)
+    # are set up here, after the fork, so no socket is shared between workers
+    from app import init_worker
+    init_worker()
@@ -0,0 +1,272 @@
+import argparse
+import datetime
+
+import archive
+import circuit
+import shards
+from repository import OccupancyRepo, streaming_cursor, week_start
+
+# Storage maintenance for the booking tables, meant to be run from cron:
+#
+#   python maintenance.py partition --months-ahead 3
+#   python maintenance.py archive --keep-months 3
+#   python maintenance.py purge-otp --batch-size 1000
+#   python maintenance.py purge-changes --keep-days 7
+#   python maintenance.py rollup --from 2024-01-01 --to 2025-12-31
+#
+# Every command runs on all venue shards (see shards.py), or on one with
+# --shard NAME. OTPs only live on the default shard.
+#
+# booking and bkgsession are RANGE COLUMNS partitioned on bkg_date with one
+# partition per month (p202401 holds January 2024) plus a pmax catch-all.
+# Archiving a month writes it to ARCHIVE_DIR and then drops its partition,
+# which is a metadata-only operation instead of a large DELETE.
+PARTITIONED_TABLES = ('booking', 'bkgsession')
+MAX_PARTITION = 'pmax'
+
+
+def add_months(year, month, count):
+    index = year * 12 + (month - 1) + count
+    return index // 12, index % 12 + 1
+
+
+def partition_name(year, month):
+    return f"p{year:04d}{month:02d}"
+
+
+def partition_month(name):
+    # 'p202401' -> (2024, 1); None for pmax or foreign partitions
+    if len(name) != 7 or not name.startswith('p') or not name[1:].isdigit():
+        return None
+    return int(name[1:5]), int(name[5:7])
+
+
+def partition_definition(year, month):
+    upper_year, upper_month = add_months(year, month, 1)
+    return (f"PARTITION {partition_name(year, month)} "
+            f"VALUES LESS THAN ('{upper_year:04d}-{upper_month:02d}-01')")
+
+
+def existing_partitions(cur, table):
+    cur.execute("""
+        SELECT PARTITION_NAME
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = %s
+            AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def ensure_partitions(db, table, months_ahead=3):
+    # Makes sure every month from the oldest row up to months_ahead months
+    # from now has its own partition. Returns the partitions created.
+    cur = db.cursor()
+    today = datetime.date.today()
+    last = add_months(today.year, today.month, months_ahead)
+    partitions = existing_partitions(cur, table)
+
+    if not partitions:
+        cur.execute(f"SELECT MIN(bkg_date) FROM {table}")
+        oldest = cur.fetchone()[0] or today
+        month = (oldest.year, oldest.month)
+        months = []
+        while month <= last:
+            months.append(month)
+            month = add_months(month[0], month[1], 1)
+
+        definitions = [partition_definition(*m) for m in months]
+        definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+        cur.execute(f"ALTER TABLE {table} PARTITION BY RANGE COLUMNS(bkg_date) ("
+                    + ", ".join(definitions) + ")")
+        cur.close()
+        return [partition_name(*m) for m in months]
+
+    monthly = [partition_month(p) for p in partitions if partition_month(p)]
+    month = add_months(*max(monthly), 1) if monthly else (today.year, today.month)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month[0], month[1], 1)
+
+    if months:
+        # Splitting pmax is cheap as long as it is empty, which it is when
+        # partitions are kept ahead of the booking horizon
+        definitions = [partition_definition(*m) for m in months]
+        definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+        cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {MAX_PARTITION} INTO ("
+                    + ", ".join(definitions) + ")")
+    cur.close()
+    return [partition_name(*m) for m in months]
+
+
+def archive_partitions(db, table, archive_dir, keep_months=3, drop=True):
+    # Archives every monthly partition older than keep_months months before the
+    # current one, then drops it. A month enters the archive manifest only
+    # once its partition is dropped, so the admin listing never returns it
+    # twice; with drop=False the files are written but not recorded.
+    # Returns {month: rows archived}.
+    today = datetime.date.today()
+    cutoff = add_months(today.year, today.month, -keep_months)
+    cur = db.cursor()
+    partitions = existing_partitions(cur, table)
+    archived = {}
+
+    for name in partitions:
+        month = partition_month(name)
+        if not month or month >= cutoff:
+            continue
+
+        # Stream the partition so a large month is never held in memory
+        stream = streaming_cursor(db)
+        stream.execute(f"SELECT * FROM {table} PARTITION ({name})")
+        columns = [col[0] for col in stream.description]
+        entry = archive.write_month(table, month, columns, stream, archive_dir)
+        stream.close()
+        rows = entry['rows']
+
+        cur.execute(f"SELECT COUNT(*) FROM {table} PARTITION ({name})")
+        expected = cur.fetchone()[0]
+        if rows != expected:
+            raise RuntimeError(
+                f"Archive of {table} {name} has {rows} rows, partition has {expected}; not dropping")
+
+        if drop:
+            cur.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+            archive.record_month(table, month, entry, archive_dir)
+        archived[archive.month_key(month)] = rows
+
+    cur.close()
+    return archived
+
+
+def purge_expired_otps(db, batch_size=1000, grace_minutes=60):
+    # Deletes expired OTP rows in small batches so the table is never locked
+    # for long. Returns the number of rows removed.
+    cur = db.cursor()
+    total = 0
+    while True:
+        cur.execute("""
+            DELETE FROM otp_verification
+            WHERE expiry_time < NOW() - INTERVAL %s MINUTE
+            LIMIT %s
+        """, (grace_minutes, batch_size))
+        deleted = cur.rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            break
+    cur.close()
+    return total
+
+
+def purge_booking_changes(db, keep_days=7, batch_size=1000):
+    # Trims the delta-sync change log. Dashboards holding a token older than
+    # the retained window get 410 and reload the full list.
+    cur = db.cursor()
+    total = 0
+    while True:
+        cur.execute("""
+            DELETE FROM booking_change
+            WHERE changed_at < NOW() - INTERVAL %s DAY
+            ORDER BY version
+            LIMIT %s
+        """, (keep_days, batch_size))
+        deleted = cur.rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            break
+    cur.close()
+    return total
+
+
+def rebuild_occupancy(db, venue_id, start, end, chunk_weeks=8):
+    # Recounts the occupancy rollups of one venue for [start, end) a few
+    # weeks per transaction. Only rebuild months whose bookings are still in
+    # the database: archived months would be recounted as empty.
+    occupancy = OccupancyRepo(db, venue_id)
+    total = 0
+    chunk_start = week_start(start)
+    while chunk_start < end:
+        chunk_end = min(chunk_start + datetime.timedelta(weeks=chunk_weeks), end)
+        total += occupancy.rebuild(chunk_start, chunk_end)
+        db.commit()
+        chunk_start = week_start(chunk_end - datetime.timedelta(days=1)) + datetime.timedelta(days=7)
+    occupancy.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Booking storage maintenance")
+    parser.add_argument('--shard', default=None, help="only run on this shard")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    partition = commands.add_parser('partition', help="create monthly partitions ahead of time")
+    partition.add_argument('--months-ahead', type=int, default=3)
+
+    archive_cmd = commands.add_parser('archive', help="archive and drop old monthly partitions")
+    archive_cmd.add_argument('--keep-months', type=int, default=3)
+    archive_cmd.add_argument('--archive-dir', default=None,
+                             help="defaults to ARCHIVE_DIR, which is also where the admin listing reads from")
+    archive_cmd.add_argument('--no-drop', action='store_true',
+                             help="write the archive files but keep the partitions")
+
+    purge = commands.add_parser('purge-otp', help="delete expired OTP rows")
+    purge.add_argument('--batch-size', type=int, default=1000)
+    purge.add_argument('--grace-minutes', type=int, default=60)
+
+    changes = commands.add_parser('purge-changes', help="trim the booking change log")
+    changes.add_argument('--keep-days', type=int, default=7)
+    changes.add_argument('--batch-size', type=int, default=1000)
+
+    today = datetime.date.today()
+    rollup = commands.add_parser('rollup', help="rebuild the occupancy rollups from the bookings")
+    rollup.add_argument('--from', dest='date_from', type=datetime.date.fromisoformat,
+                        default=today.replace(day=1))
+    rollup.add_argument('--to', dest='date_to', type=datetime.date.fromisoformat,
+                        default=today + datetime.timedelta(days=365))
+
+    args = parser.parse_args()
+
+    from app import get_db_connection, load_config
+    config = load_config()
+    shard_names = [args.shard] if args.shard else shards.shard_names(config)
+
+    for shard in shard_names:
+        if args.command == 'purge-otp' and shard != shards.DEFAULT_SHARD:
+            continue
+
+        try:
+            db = get_db_connection(shards.shard_config(config, shard))
+        except circuit.DatabaseUnavailable as e:
+            raise SystemExit(f"Could not connect to the database of shard {shard}: {e}")
+
+        try:
+            if args.command == 'partition':
+                for table in PARTITIONED_TABLES:
+                    created = ensure_partitions(db, table, args.months_ahead)
+                    print(f"[{shard}] {table}: created {len(created)} partitions {created}")
+            elif args.command == 'archive':
+                archive_dir = archive.shard_dir(shard, args.archive_dir or config['ARCHIVE_DIR'])
+                for table in PARTITIONED_TABLES:
+                    archived = archive_partitions(db, table, archive_dir, args.keep_months,
+                                                  drop=not args.no_drop)
+                    print(f"[{shard}] {table}: archived {archived}")
+            elif args.command == 'purge-otp':
+                deleted = purge_expired_otps(db, args.batch_size, args.grace_minutes)
+                print(f"[{shard}] otp_verification: deleted {deleted} expired rows")
+            elif args.command == 'purge-changes':
+                deleted = purge_booking_changes(db, args.keep_days, args.batch_size)
+                print(f"[{shard}] booking_change: deleted {deleted} rows")
+            elif args.command == 'rollup':
+                end = args.date_to + datetime.timedelta(days=1)
+                for venue_id in shards.shard_venues(config, shard):
+                    days = rebuild_occupancy(db, venue_id, args.date_from, end)
+                    print(f"[{shard}] {venue_id}: rebuilt occupancy for {days} days")
+        finally:
+            db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+-- Prepare booking storage for monthly partitioning (see maintenance.py).
+-- MySQL requires the partitioning column in every unique key, so the booking
+-- primary key becomes (ref_num, bkg_date); lookups by ref_num still use it.
+ALTER TABLE booking DROP PRIMARY KEY, ADD PRIMARY KEY (ref_num, bkg_date);
+
+-- Lets the expired OTP purge find rows without a full scan
+CREATE INDEX idx_otp_expiry ON otp_verification (expiry_time);
+
+-- Then create the monthly partitions with:
+--   python maintenance.py partition --months-ahead 3
@@ -0,0 +1,14 @@
+-- Change log behind /api/admin/bookings/changes. Every booking write appends
+-- a row in the same transaction; version is the delta-sync token and
+-- 'cancel' rows are the tombstones of deleted bookings.
+CREATE TABLE booking_change (
+  version BIGINT NOT NULL AUTO_INCREMENT,
+  ref_num VARCHAR(255) NOT NULL,
+  change_type ENUM('upsert', 'cancel') NOT NULL,
+  changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (version),
+  INDEX idx_change_time (changed_at)
+);
+
+-- Old entries are removed with:
+--   python maintenance.py purge-changes --keep-days 7
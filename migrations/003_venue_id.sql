@@ -0,0 +1,19 @@
+-- Multi-venue support: every session, booking and change log row belongs to
+-- a venue. Existing rows become the 'default' venue; if DEFAULT_VENUE is set
+-- to another name, update venue_id on the existing rows to match.
+ALTER TABLE bkgsession
+  ADD COLUMN venue_id VARCHAR(64) NOT NULL DEFAULT 'default' FIRST,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (venue_id, bkg_date, bkg_time);
+
+ALTER TABLE booking
+  ADD COLUMN venue_id VARCHAR(64) NOT NULL DEFAULT 'default' FIRST,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (venue_id, ref_num, bkg_date),
+  ADD INDEX idx_booking_slot (venue_id, bkg_date, bkg_time);
+
+ALTER TABLE booking_change
+  ADD COLUMN venue_id VARCHAR(64) NOT NULL DEFAULT 'default' AFTER version,
+  ADD INDEX idx_change_venue (venue_id, version);
+
+-- Each additional shard database gets the full booking_system.sql schema.
@@ -0,0 +1,25 @@
+-- Rule-based sessions (schedule.py): weekly templates and closures replace
+-- generating a bkgsession row per day and time. Existing bkgsession rows keep
+-- working as overrides, so nothing has to be migrated; once a venue has rules
+-- its generated rows can be deleted.
+CREATE TABLE schedule_rule (
+  id BIGINT NOT NULL AUTO_INCREMENT,
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  weekday TINYINT NOT NULL,
+  bkg_time TIME NOT NULL,
+  slot_limit INTEGER NOT NULL DEFAULT 5,
+  valid_from DATE,
+  valid_to DATE,
+  PRIMARY KEY (id),
+  INDEX idx_rule_venue (venue_id)
+);
+
+CREATE TABLE schedule_exception (
+  id BIGINT NOT NULL AUTO_INCREMENT,
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  exc_date DATE NOT NULL,
+  bkg_time TIME,
+  reason VARCHAR(255),
+  PRIMARY KEY (id),
+  INDEX idx_exception_venue (venue_id, exc_date)
+);
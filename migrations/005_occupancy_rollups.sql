@@ -0,0 +1,19 @@
+-- Occupancy rollups behind /api/admin/occupancy. Booking writes keep them up
+-- to date from now on; fill them for existing bookings once with
+--   python maintenance.py rollup --from 2024-01-01
+-- Archived months have no bookings left to count, so don't rebuild those.
+CREATE TABLE occupancy_daily (
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  day DATE NOT NULL,
+  booked INTEGER NOT NULL DEFAULT 0,
+  capacity INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (venue_id, day)
+);
+
+CREATE TABLE occupancy_weekly (
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  week_start DATE NOT NULL,
+  booked INTEGER NOT NULL DEFAULT 0,
+  capacity INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (venue_id, week_start)
+);
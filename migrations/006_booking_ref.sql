@@ -0,0 +1,16 @@
+-- booking's primary key became (venue_id, ref_num, bkg_date) for
+-- partitioning (001, 003), so it no longer keeps booking references unique.
+-- booking_ref is not partitioned and holds every reference ever issued;
+-- make_booking reserves a reference here before inserting the booking.
+CREATE TABLE booking_ref (
+  ref_num VARCHAR(255) NOT NULL,
+  venue_id VARCHAR(64) NOT NULL DEFAULT 'default',
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (ref_num)
+);
+
+-- Reserve the references of existing bookings. Duplicates created before this
+-- migration are skipped and have to be resolved by hand, find them with:
+--   SELECT ref_num, COUNT(*) FROM booking GROUP BY ref_num HAVING COUNT(*) > 1;
+INSERT IGNORE INTO booking_ref (ref_num, venue_id)
+SELECT ref_num, MIN(venue_id) FROM booking GROUP BY ref_num;
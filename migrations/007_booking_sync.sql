@@ -0,0 +1,22 @@
+-- The AUTO_INCREMENT version of booking_change was allocated when a change
+-- was inserted, not when it committed: a delta-sync token could move past a
+-- slow transaction's version before that transaction committed, and the
+-- dashboard never saw the change. Versions now come from a per-venue counter
+-- row that each booking write bumps in its own transaction; the row lock
+-- makes versions of a venue commit in order.
+CREATE TABLE booking_sync (
+  venue_id VARCHAR(64) NOT NULL,
+  version BIGINT NOT NULL,
+  PRIMARY KEY (venue_id)
+);
+
+-- Existing versions are kept, so tokens held by dashboards stay valid and
+-- each venue continues from the highest version it already has.
+ALTER TABLE booking_change
+  MODIFY version BIGINT NOT NULL,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (venue_id, version),
+  DROP INDEX idx_change_venue;
+
+INSERT INTO booking_sync (venue_id, version)
+SELECT venue_id, MAX(version) FROM booking_change GROUP BY venue_id;
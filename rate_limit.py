@@ -0,0 +1,204 @@
+import collections
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+# Token-bucket rate limiting for the public write endpoints.
+#
+# A policy is written as "<requests>/<seconds>", e.g. "5/60" allows a burst of
+# 5 requests and then refills one token every 12 seconds. Every route has a
+# policy per key ("ip" and "email"); a request must get a token from each of
+# them. Any policy can be overridden with an environment variable named
+# RATE_LIMIT_<ROUTE>_<KEY>, e.g. RATE_LIMIT_VERIFY_OTP_EMAIL=5/300, and "off"
+# disables that single policy.
+DEFAULT_POLICIES = {
+    'request_otp': {'ip': '10/60', 'email': '3/300'},
+    'verify_otp': {'ip': '30/60', 'email': '5/300'},
+    'make_booking': {'ip': '10/60', 'email': '5/300'},
+}
+
+# App config:
+#   RATE_LIMIT_ENABLED          0 switches the whole limiter off
+#   RATE_LIMIT_STORAGE_URL      redis://host:6379/0 shares buckets between
+#                               gunicorn workers/hosts; without it every worker
+#                               keeps its own buckets
+#   RATE_LIMIT_TRUSTED_PROXIES  number of reverse proxies in front of the app
+#                               that append to X-Forwarded-For (0 = use the
+#                               socket address)
+
+
+def parse_policy(policy):
+    # "5/60" -> (capacity 5, refill 5/60 tokens per second)
+    if not policy or policy.lower() == 'off':
+        return None
+    count, seconds = policy.split('/')
+    capacity = int(count)
+    period = float(seconds)
+    if capacity <= 0 or period <= 0:
+        raise ValueError(f"Invalid rate limit policy: {policy}")
+    return capacity, capacity / period
+
+
+def get_policies(route):
+    policies = {}
+    for key, default in DEFAULT_POLICIES.get(route, {}).items():
+        env_name = f"RATE_LIMIT_{route.upper()}_{key.upper()}"
+        parsed = parse_policy(os.getenv(env_name, default))
+        if parsed:
+            policies[key] = parsed
+    return policies
+
+
+class MemoryBackend:
+    # Buckets live in this process only. The table is capped at max_keys and
+    # evicts the least recently used bucket, so a flood of unique emails can't
+    # grow memory without bound.
+    def __init__(self, max_keys=100000):
+        self.buckets = collections.OrderedDict()
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                retry_after = 0
+            else:
+                self.buckets[key] = (tokens, now)
+                retry_after = (1 - tokens) / rate
+
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+
+        return retry_after == 0, retry_after
+
+
+class RedisBackend:
+    # The bucket update runs as a single Lua script so that concurrent workers
+    # can't both spend the last token.
+    SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local t = redis.call('TIME')
+        local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+        local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(data[1]) or capacity
+        local last = tonumber(data[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+        local retry_after = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            retry_after = (1 - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return tostring(retry_after)
+    """
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for the shared backend
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.errors = (redis.RedisError, OSError)
+        # While Redis is unreachable each worker limits on its own buckets
+        # rather than failing the request
+        self.fallback = MemoryBackend()
+        self.failing = False
+
+    def consume(self, key, capacity, rate):
+        try:
+            retry_after = float(self.script(keys=['ratelimit:' + key], args=[capacity, rate]))
+        except self.errors as e:
+            if not self.failing:
+                print(f"Rate limit storage unavailable, limiting per worker: {str(e)}")
+                self.failing = True
+            return self.fallback.consume(key, capacity, rate)
+        if self.failing:
+            print("Rate limit storage is available again")
+            self.failing = False
+        return retry_after == 0, retry_after
+
+
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+def get_backend(config):
+    # Created lazily and per process, so a backend (or Redis socket) created
+    # before a fork is never shared between workers
+    global _backend, _backend_pid
+    with _backend_lock:
+        if _backend is None or _backend_pid != os.getpid():
+            if config['RATE_LIMIT_STORAGE_URL']:
+                _backend = RedisBackend(config['RATE_LIMIT_STORAGE_URL'])
+            else:
+                _backend = MemoryBackend()
+            _backend_pid = os.getpid()
+        return _backend
+
+
+def client_ip():
+    # Each trusted proxy appends the address it received the request from, so
+    # the client is the Nth entry from the right (like werkzeug's
+    # ProxyFix(x_for=N)). Entries further left come from the client itself
+    # and can be forged.
+    trusted = current_app.config['RATE_LIMIT_TRUSTED_PROXIES']
+    if trusted:
+        forwarded = [value.strip() for value in request.headers.get('X-Forwarded-For', '').split(',')
+                     if value.strip()]
+        if len(forwarded) >= trusted:
+            return forwarded[-trusted]
+    return request.remote_addr or 'unknown'
+
+
+def client_email():
+    data = request.get_json(silent=True) or {}
+    email = data.get('email') if isinstance(data, dict) else None
+    if not email or not isinstance(email, str):
+        return None
+    return email.strip().lower()
+
+
+def check_rate_limit(route):
+    # Returns the number of seconds to wait, or 0 when the request may proceed
+    identities = {'ip': client_ip(), 'email': client_email()}
+    backend = get_backend(current_app.config)
+    retry_after = 0
+    for key, (capacity, rate) in get_policies(route).items():
+        identity = identities.get(key)
+        if not identity:
+            continue
+        allowed, wait = backend.consume(f"{route}:{key}:{identity}", capacity, rate)
+        if not allowed:
+            retry_after = max(retry_after, wait)
+    return retry_after
+
+
+def rate_limit(route):
+    # Must sit below @app.route so that throttled requests are rejected
+    # before the view opens a database connection
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if current_app.config['RATE_LIMIT_ENABLED']:
+                retry_after = check_rate_limit(route)
+                if retry_after:
+                    seconds = max(1, math.ceil(retry_after))
+                    response = jsonify({
+                        "error": "Too many requests, please try again later",
+                        "retry_after": seconds
+                    })
+                    return response, 429, {'Retry-After': str(seconds)}
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
@@ -0,0 +1,639 @@
+import datetime
+import sqlite3
+
+import circuit
+import schedule
+
+# Data-access layer. Every query the app runs is a named statement below,
+# written once with %s placeholders, so each operation always sends MySQL the
+# same statement shape. Dates and times are formatted in Python rather than
+# with DATE_FORMAT so the same statements also run on SQLite.
+#
+# Backends:
+#   - mysqlclient (MySQLdb): statements are sent as text; mysqlclient has no
+#     server-side prepared statement support
+#   - mysql-connector-python: pure-Python alternative, statements are also
+#     sent as text
+#   - sqlite3: for local development, tests and benchmarks without a MySQL
+#     server (schema in booking_system.sqlite.sql)
+
+
+# MySQL errors of a transaction that lost out on a lock: lock wait timeout
+# and deadlock (the server has rolled the transaction back)
+LOCK_CONFLICT_CODES = {1205, 1213}
+
+
+class LockConflict(Exception):
+    pass
+
+
+def dialect_of(db):
+    if isinstance(db, sqlite3.Connection):
+        return 'sqlite'
+    if type(db).__module__.startswith('mysql.connector'):
+        return 'mysql-connector'
+    return 'mysql'
+
+
+def streaming_cursor(db):
+    # Unbuffered cursor for the connection's driver; mysql-connector cursors
+    # are unbuffered by default and SQLite reads from the file as it goes
+    if dialect_of(db) == 'mysql':
+        # Imported here so the other backends work without mysqlclient installed
+        import MySQLdb.cursors
+        return db.cursor(MySQLdb.cursors.SSCursor)
+    return db.cursor()
+
+
+def to_date(value):
+    # DATE columns come back as date objects from MySQL and as text from SQLite
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def to_time(value):
+    # TIME columns come back as timedelta from MySQL and as text from SQLite;
+    # returns 'HH:MM:SS'
+    if value is None:
+        return None
+    if isinstance(value, datetime.timedelta):
+        total = int(value.total_seconds())
+        return f"{total // 3600:02d}:{total % 3600 // 60:02d}:{total % 60:02d}"
+    if isinstance(value, datetime.time):
+        return value.strftime('%H:%M:%S')
+    parts = [int(p) for p in str(value).split(':')]
+    parts += [0] * (3 - len(parts))
+    return f"{parts[0]:02d}:{parts[1]:02d}:{parts[2]:02d}"
+
+
+def month_range(year, month):
+    # [first day of the month, first day of the next month)
+    start = datetime.date(int(year), int(month), 1)
+    if start.month == 12:
+        return start, datetime.date(start.year + 1, 1, 1)
+    return start, datetime.date(start.year, start.month + 1, 1)
+
+
+class Repo:
+    STATEMENTS = {}
+    # Statements that need different SQL on SQLite
+    SQLITE_STATEMENTS = {}
+
+    def __init__(self, db, venue_id=None):
+        self.db = db
+        self.venue_id = venue_id
+        self.dialect = dialect_of(db)
+        self._cur = None
+
+    @property
+    def cur(self):
+        if self._cur is None:
+            if self.dialect == 'mysql-connector':
+                # Buffered like mysqlclient's default cursor, so the next
+                # statement can run before every row has been fetched
+                self._cur = self.db.cursor(buffered=True)
+            else:
+                self._cur = self.db.cursor()
+        return self._cur
+
+    def close(self):
+        if self._cur is not None:
+            self._cur.close()
+            self._cur = None
+
+    def statement(self, name):
+        if self.dialect == 'sqlite':
+            return self.SQLITE_STATEMENTS.get(name, self.STATEMENTS[name]).replace('%s', '?')
+        return self.STATEMENTS[name]
+
+    def params(self, params):
+        if self.dialect != 'sqlite':
+            return params
+        # Store dates and times as sortable ISO text on SQLite
+        converted = []
+        for value in params:
+            if isinstance(value, datetime.datetime):
+                value = value.strftime('%Y-%m-%d %H:%M:%S')
+            elif isinstance(value, datetime.date):
+                value = value.isoformat()
+            elif isinstance(value, (datetime.time, datetime.timedelta)):
+                value = to_time(value)
+            converted.append(value)
+        return tuple(converted)
+
+    def run(self, call):
+        # Reports the outcome to the connection's circuit breaker (set by
+        # get_db_connection); a dropped or timed out query counts as a failure
+        breaker = getattr(self.db, 'breaker', None)
+        try:
+            result = call()
+        except Exception as e:
+            if breaker is not None and circuit.is_connection_error(e):
+                breaker.record_failure()
+                raise circuit.DatabaseUnavailable(f"Lost the database connection: {e}",
+                                                  breaker.retry_after()) from e
+            if circuit.error_code(e) in LOCK_CONFLICT_CODES:
+                raise LockConflict(str(e)) from e
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+    def execute(self, name, params=()):
+        self.run(lambda: self.cur.execute(self.statement(name), self.params(params)))
+        return self.cur
+
+    def executemany(self, name, rows):
+        self.run(lambda: self.cur.executemany(self.statement(name), [self.params(row) for row in rows]))
+        return self.cur
+
+    def stream(self, name, params=()):
+        # Cursor that pulls rows from the server as they are fetched instead of
+        # buffering the whole result; the caller closes it
+        cur = streaming_cursor(self.db)
+        self.run(lambda: cur.execute(self.statement(name), self.params(params)))
+        return cur
+
+
+class OtpRepo(Repo):
+    STATEMENTS = {
+        'exists': "SELECT 1 FROM otp_verification WHERE email = %s",
+        'update': """
+            UPDATE otp_verification
+            SET otp = %s, expiry_time = %s, is_valid = 1
+            WHERE email = %s
+        """,
+        'insert': """
+            INSERT INTO otp_verification
+            (email, otp, expiry_time, is_valid)
+            VALUES (%s, %s, %s, 1)
+        """,
+        'verify': """
+            SELECT 1
+            FROM otp_verification
+            WHERE email = %s
+                AND otp = %s
+                AND is_valid = 1
+                AND expiry_time > %s
+            LIMIT 1
+        """,
+        'invalidate': """
+            UPDATE otp_verification
+            SET is_valid = 0
+            WHERE email = %s
+        """,
+    }
+
+    def save(self, email, otp, expiry_time):
+        # One row per email: a new OTP replaces any previous one
+        if self.execute('exists', (email,)).fetchone():
+            self.execute('update', (otp, expiry_time, email))
+        else:
+            self.execute('insert', (email, otp, expiry_time))
+
+    def verify(self, email, otp, now):
+        # Marks the OTP as used and returns True when it is valid
+        if not self.execute('verify', (email, otp, now)).fetchone():
+            return False
+        self.execute('invalidate', (email,))
+        return True
+
+
+class SessionRepo(Repo):
+    # Scoped to one venue: SessionRepo(db, venue_id). Sessions come from the
+    # venue's schedule rules with bkgsession rows as overrides, see schedule.py
+    STATEMENTS = {
+        'insert': "INSERT IGNORE INTO bkgsession (venue_id, bkg_date, bkg_time, slot_limit) VALUES (%s, %s, %s, %s)",
+        'list_range': """
+            SELECT bkg_date, bkg_time, slot_limit
+            FROM bkgsession
+            WHERE venue_id = %s AND bkg_date >= %s AND bkg_date < %s
+            ORDER BY bkg_date, bkg_time
+        """,
+        'slot_limit': "SELECT slot_limit FROM bkgsession WHERE venue_id = %s AND bkg_date = %s AND bkg_time = %s",
+        'booked_range': """
+            SELECT bkg_date, bkg_time, COUNT(*)
+            FROM booking
+            WHERE venue_id = %s AND bkg_date >= %s AND bkg_date < %s
+            GROUP BY bkg_date, bkg_time
+        """,
+        'booked_slot': "SELECT COUNT(*) FROM booking WHERE venue_id = %s AND bkg_date = %s AND bkg_time = %s",
+        # Locks (creating it if needed) the venue's occupancy_daily row of a
+        # day until commit; booked is left as it is
+        'lock_day': """
+            INSERT INTO occupancy_daily (venue_id, day, booked, capacity) VALUES (%s, %s, 0, 0)
+            ON DUPLICATE KEY UPDATE booked = booked
+        """,
+        'rules': """
+            SELECT weekday, bkg_time, slot_limit, valid_from, valid_to
+            FROM schedule_rule
+            WHERE venue_id = %s
+        """,
+        'exceptions': """
+            SELECT exc_date, bkg_time, reason
+            FROM schedule_exception
+            WHERE venue_id = %s
+            ORDER BY exc_date, bkg_time
+        """,
+        'delete_rules': "DELETE FROM schedule_rule WHERE venue_id = %s",
+        'insert_rule': """
+            INSERT INTO schedule_rule (venue_id, weekday, bkg_time, slot_limit, valid_from, valid_to)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+        'delete_exceptions': "DELETE FROM schedule_exception WHERE venue_id = %s",
+        'insert_exception': """
+            INSERT INTO schedule_exception (venue_id, exc_date, bkg_time, reason)
+            VALUES (%s, %s, %s, %s)
+        """,
+    }
+    SQLITE_STATEMENTS = {
+        'insert': "INSERT OR IGNORE INTO bkgsession (venue_id, bkg_date, bkg_time, slot_limit) VALUES (%s, %s, %s, %s)",
+        # Any write takes SQLite's database lock, which serialises writers
+        'lock_day': "INSERT OR IGNORE INTO occupancy_daily (venue_id, day, booked, capacity) VALUES (%s, %s, 0, 0)",
+    }
+
+    def create_month(self, year, month, times, slot_limit):
+        # Creates an override session for every day of the month at each of
+        # the given times; existing ones are left untouched. Returns the day count.
+        start, end = month_range(year, month)
+        days = [start + datetime.timedelta(days=i) for i in range((end - start).days)]
+        self.executemany('insert', [(self.venue_id, day, to_time(t), slot_limit) for day in days for t in times])
+        return len(days)
+
+    def rule_rows(self):
+        rows = self.execute('rules', (self.venue_id,)).fetchall()
+        return [(weekday, to_time(t), limit, to_date(valid_from), to_date(valid_to))
+                for weekday, t, limit, valid_from, valid_to in rows]
+
+    def exception_rows(self):
+        rows = self.execute('exceptions', (self.venue_id,)).fetchall()
+        return [(to_date(d), to_time(t), reason) for d, t, reason in rows]
+
+    def replace_rules(self, rules):
+        # rules: [(weekday, bkg_time, slot_limit, valid_from, valid_to)]
+        self.execute('delete_rules', (self.venue_id,))
+        self.executemany('insert_rule', [(self.venue_id, weekday, to_time(t), limit, to_date(valid_from),
+                                          to_date(valid_to))
+                                         for weekday, t, limit, valid_from, valid_to in rules])
+
+    def replace_exceptions(self, exceptions):
+        # exceptions: [(date, bkg_time or None for the whole day, reason)]
+        self.execute('delete_exceptions', (self.venue_id,))
+        self.executemany('insert_exception', [(self.venue_id, to_date(d), to_time(t), reason)
+                                              for d, t, reason in exceptions])
+
+    def load_schedule(self, cached=True):
+        # cached=False reads the rules as this transaction sees them, e.g. right
+        # after replacing them, and leaves the worker's cache alone; the caller
+        # invalidates it once the change is committed
+        def load():
+            return schedule.Schedule(self.rule_rows(), self.exception_rows())
+        return schedule.get_schedule(self.venue_id, load) if cached else load()
+
+    def list_range(self, start, end, cached=True):
+        # [(date, 'HH:MM:SS', slot_limit)] of every session in [start, end)
+        overrides = self.execute('list_range', (self.venue_id, start, end)).fetchall()
+        overrides = [(to_date(d), to_time(t), limit) for d, t, limit in overrides]
+        return self.load_schedule(cached).sessions(start, end, overrides)
+
+    def list_month(self, year, month):
+        return self.list_range(*month_range(year, month))
+
+    def slot_limit(self, bkg_date, bkg_time):
+        # slot_limit of one session, or None when there is no such session
+        bkg_date, bkg_time = to_date(bkg_date), to_time(bkg_time)
+        row = self.execute('slot_limit', (self.venue_id, bkg_date, bkg_time)).fetchone()
+        if row:
+            return row[0]
+        return self.load_schedule().day(bkg_date).get(bkg_time)
+
+    def slot_limit_rows(self, bkg_date, bkg_time):
+        slot_limit = self.slot_limit(bkg_date, bkg_time)
+        return [] if slot_limit is None else [(slot_limit,)]
+
+    def availability_month(self, year, month):
+        # [(date, 'HH:MM:SS', available slots)] for every session of the month
+        start, end = month_range(year, month)
+        rows = self.execute('booked_range', (self.venue_id, start, end)).fetchall()
+        booked = {(to_date(d), to_time(t)): count for d, t, count in rows}
+        return [(d, t, limit - booked.get((d, t), 0)) for d, t, limit in self.list_range(start, end)]
+
+    def lock_days(self, days):
+        # Serialises the booking writes of these days until commit, in date
+        # order so writes locking several days can't deadlock. The lock is on
+        # a real row: a locking COUNT over an empty slot only takes gap locks,
+        # which two first bookings both get and then deadlock on when inserting.
+        for day in sorted({to_date(d) for d in days}):
+            self.execute('lock_day', (self.venue_id, day))
+
+    def availability_slot(self, bkg_date, bkg_time, for_update=False):
+        # Same as availability_month for one session; [] when it doesn't exist.
+        # for_update locks the day until commit while a booking is added or
+        # moved there. It has to come before the transaction's first plain
+        # read: InnoDB takes the read snapshot then, and the count must see
+        # every booking committed by the writers that held the lock before.
+        bkg_date, bkg_time = to_date(bkg_date), to_time(bkg_time)
+        if for_update:
+            self.lock_days([bkg_date])
+        slot_limit = self.slot_limit(bkg_date, bkg_time)
+        if slot_limit is None:
+            return []
+        booked = self.execute('booked_slot', (self.venue_id, bkg_date, bkg_time)).fetchone()[0]
+        return [(bkg_date, bkg_time, slot_limit - booked)]
+
+
+class BookingRepo(Repo):
+    # Scoped to one venue: BookingRepo(db, venue_id). Without a venue only
+    # list_all() may be used, and it returns every venue on the shard.
+    COLUMNS = ['ref_num', 'phone', 'email', 'bkg_date', 'bkg_time', 'family_name', 'table_num', 'venue_id']
+    SELECT = "SELECT ref_num, phone, email, bkg_date, bkg_time, family_name, table_num, venue_id FROM booking"
+
+    STATEMENTS = {
+        'insert': """
+            INSERT INTO booking (venue_id, phone, email, bkg_date, bkg_time, family_name, table_num, ref_num)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        # booking's primary key includes bkg_date for partitioning, so
+        # booking_ref is what keeps references unique on the shard
+        'reserve_ref': "INSERT IGNORE INTO booking_ref (ref_num, venue_id) VALUES (%s, %s)",
+        'get': SELECT + " WHERE venue_id = %s AND ref_num = %s AND family_name = %s",
+        'list_all': SELECT,
+        'list_venue': SELECT + " WHERE venue_id = %s",
+        'slot': "SELECT bkg_date, bkg_time FROM booking WHERE venue_id = %s AND ref_num = %s",
+        # Fixed shape: a NULL parameter keeps the current value of that column
+        'update': """
+            UPDATE booking SET
+                email = COALESCE(%s, email),
+                phone = COALESCE(%s, phone),
+                table_num = COALESCE(%s, table_num),
+                bkg_date = COALESCE(%s, bkg_date),
+                bkg_time = COALESCE(%s, bkg_time),
+                family_name = COALESCE(%s, family_name)
+            WHERE venue_id = %s AND ref_num = %s
+        """,
+        'delete': "DELETE FROM booking WHERE venue_id = %s AND ref_num = %s",
+        'export_all': SELECT + """
+            WHERE venue_id = %s AND bkg_date BETWEEN %s AND %s
+            ORDER BY bkg_date, bkg_time
+        """,
+        'export_upcoming': SELECT + """
+            WHERE venue_id = %s AND bkg_date BETWEEN %s AND %s AND bkg_date >= %s
+            ORDER BY bkg_date, bkg_time
+        """,
+        'export_past': SELECT + """
+            WHERE venue_id = %s AND bkg_date BETWEEN %s AND %s AND bkg_date < %s
+            ORDER BY bkg_date, bkg_time
+        """,
+        'bump_version': """
+            INSERT INTO booking_sync (venue_id, version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """,
+        'current_version': "SELECT version FROM booking_sync WHERE venue_id = %s",
+        'record_change': """
+            INSERT INTO booking_change (venue_id, version, ref_num, change_type) VALUES (%s, %s, %s, %s)
+        """,
+        'oldest_change': "SELECT MIN(version) FROM booking_change WHERE venue_id = %s",
+        'changes_since': """
+            SELECT c.version, c.ref_num, b.ref_num, b.phone, b.email, b.bkg_date, b.bkg_time, b.family_name,
+                b.table_num, b.venue_id
+            FROM booking_change c
+                LEFT JOIN booking b ON b.venue_id = c.venue_id AND b.ref_num = c.ref_num
+            WHERE c.venue_id = %s AND c.version > %s
+            ORDER BY c.version
+            LIMIT %s
+        """,
+    }
+    SQLITE_STATEMENTS = {
+        'reserve_ref': "INSERT OR IGNORE INTO booking_ref (ref_num, venue_id) VALUES (%s, %s)",
+        'bump_version': """
+            INSERT INTO booking_sync (venue_id, version) VALUES (%s, 1)
+            ON CONFLICT (venue_id) DO UPDATE SET version = version + 1
+        """,
+    }
+
+    @staticmethod
+    def to_dict(row):
+        # API representation: dates as YYYY-MM-DD, times as HH:MM
+        ref_num, phone, email, bkg_date, bkg_time, family_name, table_num, venue_id = row
+        bkg_date = to_date(bkg_date)
+        bkg_time = to_time(bkg_time)
+        return {
+            "ref_num": ref_num,
+            "phone": phone,
+            "email": email,
+            "bkg_date": bkg_date.isoformat() if bkg_date else None,
+            "bkg_time": bkg_time[:5] if bkg_time else None,
+            "family_name": family_name,
+            "table_num": table_num,
+            "venue_id": venue_id
+        }
+
+    def create(self, ref_num, phone, email, bkg_date, bkg_time, family_name, table_num):
+        self.execute('insert', (self.venue_id, phone, email, to_date(bkg_date), to_time(bkg_time),
+                                family_name, table_num, ref_num))
+
+    def reserve_ref(self, ref_num):
+        # Claims a reference in the caller's transaction; False when it is
+        # taken. References stay reserved after a cancellation so they are
+        # never reused.
+        return self.execute('reserve_ref', (ref_num, self.venue_id)).rowcount == 1
+
+    def get(self, ref_num, family_name):
+        return [self.to_dict(row) for row in self.execute('get', (self.venue_id, ref_num, family_name)).fetchall()]
+
+    def list_all(self):
+        if self.venue_id is None:
+            return [self.to_dict(row) for row in self.execute('list_all').fetchall()]
+        return [self.to_dict(row) for row in self.execute('list_venue', (self.venue_id,)).fetchall()]
+
+    def get_slot(self, ref_num):
+        # (bkg_date, 'HH:MM:SS') of a booking, or None
+        row = self.execute('slot', (self.venue_id, ref_num)).fetchone()
+        return (to_date(row[0]), to_time(row[1])) if row else None
+
+    def update(self, ref_num, email=None, phone=None, table_num=None, bkg_date=None, bkg_time=None,
+               family_name=None):
+        # Returns the number of rows changed
+        return self.execute('update', (email, phone, table_num, to_date(bkg_date), to_time(bkg_time),
+                                       family_name, self.venue_id, ref_num)).rowcount
+
+    def delete(self, ref_num):
+        return self.execute('delete', (self.venue_id, ref_num)).rowcount
+
+    def stream_range(self, date_from, date_to, status='all', today=None):
+        # Unbuffered cursor over the bookings in [date_from, date_to]; the
+        # caller fetches in chunks and closes it
+        if status == 'all':
+            return self.stream('export_all', (self.venue_id, date_from, date_to))
+        return self.stream('export_' + status, (self.venue_id, date_from, date_to, today or datetime.date.today()))
+
+    def record_change(self, ref_num, change_type):
+        # Appends to the booking change log in the caller's transaction. The
+        # version, the token used by /api/admin/bookings/changes, comes from the
+        # venue's booking_sync row; bumping it locks the row until commit, so a
+        # venue's versions become visible in order and a token never passes a
+        # change that is still uncommitted. Call it as the last write before
+        # commit to keep the lock short.
+        self.execute('bump_version', (self.venue_id,))
+        version = self.execute('current_version', (self.venue_id,)).fetchone()[0]
+        self.execute('record_change', (self.venue_id, version, ref_num, change_type))
+        return version
+
+    def change_bounds(self):
+        # (oldest version still in the log, latest committed version) of the
+        # venue, None when there is none
+        oldest = self.execute('oldest_change', (self.venue_id,)).fetchone()[0]
+        latest = self.execute('current_version', (self.venue_id,)).fetchone()
+        return oldest, latest[0] if latest else None
+
+    def changes_since(self, version, limit):
+        # [(version, ref_num, booking dict or None when it no longer exists)]
+        rows = self.execute('changes_since', (self.venue_id, version, limit)).fetchall()
+        return [(row[0], row[1], self.to_dict(row[2:]) if row[2] is not None else None) for row in rows]
+
+
+def week_start(day):
+    # Weeks run Monday to Sunday and are keyed by their Monday
+    return day - datetime.timedelta(days=day.weekday())
+
+
+class OccupancyRepo(Repo):
+    # Scoped to one venue: OccupancyRepo(db, venue_id). Booked places and
+    # capacity per day and per week, kept up to date by the booking writes and
+    # rebuilt offline by "python maintenance.py rollup"
+    UPSERT = {
+        'daily': """
+            INSERT INTO occupancy_daily (venue_id, day, booked, capacity) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE booked = {booked}, capacity = VALUES(capacity)
+        """,
+        'weekly': """
+            INSERT INTO occupancy_weekly (venue_id, week_start, booked, capacity) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE booked = {booked}, capacity = VALUES(capacity)
+        """,
+    }
+    SQLITE_UPSERT = {
+        'daily': """
+            INSERT INTO occupancy_daily (venue_id, day, booked, capacity) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (venue_id, day) DO UPDATE SET booked = {booked}, capacity = excluded.capacity
+        """,
+        'weekly': """
+            INSERT INTO occupancy_weekly (venue_id, week_start, booked, capacity) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (venue_id, week_start) DO UPDATE SET booked = {booked}, capacity = excluded.capacity
+        """,
+    }
+
+    STATEMENTS = {
+        'add_day': UPSERT['daily'].format(booked="booked + VALUES(booked)"),
+        'add_week': UPSERT['weekly'].format(booked="booked + VALUES(booked)"),
+        'set_day': UPSERT['daily'].format(booked="VALUES(booked)"),
+        'set_week': UPSERT['weekly'].format(booked="VALUES(booked)"),
+        'days': """
+            SELECT day, booked, capacity
+            FROM occupancy_daily
+            WHERE venue_id = %s AND day BETWEEN %s AND %s
+            ORDER BY day
+        """,
+        'weeks': """
+            SELECT week_start, booked, capacity
+            FROM occupancy_weekly
+            WHERE venue_id = %s AND week_start BETWEEN %s AND %s
+            ORDER BY week_start
+        """,
+        'booked_by_day': """
+            SELECT bkg_date, COUNT(*)
+            FROM booking
+            WHERE venue_id = %s AND bkg_date >= %s AND bkg_date < %s
+            GROUP BY bkg_date
+        """,
+    }
+    SQLITE_STATEMENTS = {
+        'add_day': SQLITE_UPSERT['daily'].format(booked="booked + excluded.booked"),
+        'add_week': SQLITE_UPSERT['weekly'].format(booked="booked + excluded.booked"),
+        'set_day': SQLITE_UPSERT['daily'].format(booked="excluded.booked"),
+        'set_week': SQLITE_UPSERT['weekly'].format(booked="excluded.booked"),
+    }
+
+    def capacity(self, start, end, cached=True):
+        # {date: total slot_limit of its sessions} for start <= date < end
+        sessions = SessionRepo(self.db, self.venue_id)
+        try:
+            rows = sessions.list_range(start, end, cached)
+        finally:
+            sessions.close()
+        by_day = {}
+        for bkg_date, bkg_time, slot_limit in rows:
+            by_day[bkg_date] = by_day.get(bkg_date, 0) + slot_limit
+        return by_day
+
+    def _write(self, daily, weekly, name, cached=True):
+        # daily/weekly: {date: booked}; capacity is recomputed from the schedule.
+        # Every day of the weeks written gets a row (unchanged days with 0), so
+        # the daily rows add up to the weekly capacity.
+        weeks = sorted(weekly)
+        capacity = self.capacity(weeks[0], weeks[-1] + datetime.timedelta(days=7), cached)
+        daily = dict(daily)
+        for week in weeks:
+            for i in range(7):
+                daily.setdefault(week + datetime.timedelta(days=i), 0)
+        self.executemany(name + '_day', [(self.venue_id, day, booked, capacity.get(day, 0))
+                                         for day, booked in sorted(daily.items())])
+        self.executemany(name + '_week', [
+            (self.venue_id, week, booked,
+             sum(capacity.get(week + datetime.timedelta(days=i), 0) for i in range(7)))
+            for week, booked in sorted(weekly.items())])
+
+    def add(self, deltas, cached=True):
+        # deltas: {bkg_date: change in booked places}, applied in the caller's
+        # transaction. A change of 0 only refreshes the capacity.
+        daily = {}
+        for bkg_date, change in deltas.items():
+            bkg_date = to_date(bkg_date)
+            daily[bkg_date] = daily.get(bkg_date, 0) + change
+        if not daily:
+            return
+        weekly = {}
+        for day, change in daily.items():
+            weekly[week_start(day)] = weekly.get(week_start(day), 0) + change
+        self._write(daily, weekly, 'add', cached)
+
+    def refresh_capacity(self, start, end):
+        # After a schedule change: recompute capacity for start <= date < end
+        # from the schedule as the current transaction sees it
+        days = (end - start).days
+        self.add({start + datetime.timedelta(days=i): 0 for i in range(days)}, cached=False)
+
+    def rebuild(self, start, end):
+        # Recounts every day of the whole weeks covering [start, end) from the
+        # booking table; returns the number of days written
+        start = week_start(start)
+        end = week_start(end - datetime.timedelta(days=1)) + datetime.timedelta(days=7)
+        rows = self.execute('booked_by_day', (self.venue_id, start, end)).fetchall()
+        booked = {to_date(day): count for day, count in rows}
+        daily = {start + datetime.timedelta(days=i): 0 for i in range((end - start).days)}
+        daily.update(booked)
+        weekly = {}
+        for day, count in daily.items():
+            weekly[week_start(day)] = weekly.get(week_start(day), 0) + count
+        self._write(daily, weekly, 'set')
+        return len(daily)
+
+    def days(self, date_from, date_to):
+        # [(date, booked, capacity)] for date_from <= date <= date_to
+        rows = self.execute('days', (self.venue_id, date_from, date_to)).fetchall()
+        return [(to_date(day), booked, capacity) for day, booked, capacity in rows]
+
+    def weeks(self, date_from, date_to):
+        # [(monday, booked, capacity)] of the weeks overlapping [date_from, date_to]
+        rows = self.execute('weeks', (self.venue_id, week_start(date_from), date_to)).fetchall()
+        return [(to_date(week), booked, capacity) for week, booked, capacity in rows]
+
+
+class AdminRepo(Repo):
+    STATEMENTS = {
+        'get_by_username': "SELECT * FROM admins WHERE username = %s",
+    }
+
+    def get_by_username(self, username):
+        # (id, username, password_hash, created_at, last_login) or None
+        return self.execute('get_by_username', (username,)).fetchone()
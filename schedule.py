@@ -0,0 +1,88 @@
+import datetime
+import threading
+import time
+
+# Rule-based booking sessions.
+#
+# Instead of one bkgsession row per day and time, each venue has:
+#   - schedule_rule rows: "every <weekday> at <time>, <slot_limit> places",
+#     optionally limited to [valid_from, valid_to]. When several rules cover
+#     the same weekday and time, the one with the latest valid_from wins, so a
+#     date-ranged rule overrides the standing one (e.g. more places in December)
+#   - schedule_exception rows: holidays and closures, either a whole day
+#     (bkg_time NULL) or a single time
+#   - bkgsession rows: per-slot overrides that win over both, e.g. an extra
+#     session or a different slot_limit on one date
+# Sessions are expanded in memory for the dates a request asks about, so they
+# never have to be generated ahead of time. Venues without rules keep working
+# from their bkgsession rows alone.
+#
+# Seconds a worker keeps a venue's Schedule, set from SCHEDULE_CACHE_SECONDS
+# in the app config by create_app()
+cache_seconds = 30
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class Schedule:
+    def __init__(self, rules, exceptions):
+        # rules: [(weekday 0=Monday, 'HH:MM:SS', slot_limit, valid_from, valid_to)]
+        # exceptions: [(date, 'HH:MM:SS' or None for the whole day, reason)]
+        self.rules = {weekday: [] for weekday in range(7)}
+        for rule in sorted(rules, key=lambda r: r[3] or datetime.date.min):
+            self.rules[rule[0]].append(rule)
+        self.closed_days = set()
+        self.closed_slots = set()
+        for exc_date, bkg_time, reason in exceptions:
+            if bkg_time is None:
+                self.closed_days.add(exc_date)
+            else:
+                self.closed_slots.add((exc_date, bkg_time))
+
+    def day(self, day):
+        # {'HH:MM:SS': slot_limit} of the sessions the rules give one date
+        if day in self.closed_days:
+            return {}
+        slots = {}
+        for weekday, bkg_time, slot_limit, valid_from, valid_to in self.rules[day.weekday()]:
+            if (valid_from is None or valid_from <= day) and (valid_to is None or day <= valid_to):
+                slots[bkg_time] = slot_limit
+        return {t: limit for t, limit in slots.items() if (day, t) not in self.closed_slots}
+
+    def sessions(self, start, end, overrides=()):
+        # [(date, 'HH:MM:SS', slot_limit)] for start <= date < end, in order
+        slots = {}
+        day = start
+        while day < end:
+            for bkg_time, slot_limit in self.day(day).items():
+                slots[(day, bkg_time)] = slot_limit
+            day += datetime.timedelta(days=1)
+        for bkg_date, bkg_time, slot_limit in overrides:
+            slots[(bkg_date, bkg_time)] = slot_limit
+        return [(d, t, limit) for (d, t), limit in sorted(slots.items())]
+
+
+def configure(seconds):
+    global cache_seconds
+    cache_seconds = seconds
+
+
+def get_schedule(venue_id, load):
+    # Rules change rarely, so each worker keeps a venue's Schedule for
+    # cache_seconds; load() builds it from the database
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(venue_id)
+    if entry and now - entry[0] < cache_seconds:
+        return entry[1]
+    schedule = load()
+    with _cache_lock:
+        _cache[venue_id] = (now, schedule)
+    return schedule
+
+
+def invalidate(venue_id):
+    # Other workers pick up the change when their cached copy expires
+    with _cache_lock:
+        _cache.pop(venue_id, None)
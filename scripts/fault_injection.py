@@ -0,0 +1,182 @@
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Fault-injection check for the database circuit breaker (circuit.py).
+#
+# Points the app at a local stub server standing in for MySQL and hits
+# /api/bookingSummary while the stub misbehaves:
+#   drop    accepts connections and closes them straight away
+#   stall   accepts connections and never answers
+#   refuse  nothing listens on the port
+#   proxy   forwards to a real MySQL server (--upstream host:port)
+#
+#   python scripts/fault_injection.py --mode stall
+#   python scripts/fault_injection.py --mode drop --upstream 127.0.0.1:3306   # also checks recovery
+#
+# tests/test_fault_injection.py runs the drop, stall and refuse scenarios
+# with mysql-connector.
+#
+# Expected: the first DB_BREAKER_FAILURES requests wait for the timeout,
+# after that every request fails fast with 503 + Retry-After (or, with
+# --upstream, is served stale from the warm-up), and once the stub proxies
+# again a probe closes the breaker. Uses the MYSQL_USER/PASSWORD/DB settings
+# from the environment for the proxied server. Exits non-zero on failure.
+
+
+class StubServer:
+    def __init__(self, upstream=None):
+        self.upstream = upstream
+        self.mode = 'proxy' if upstream else 'drop'
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.sock.listen(128)
+        self.stalled = []
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def set_mode(self, mode):
+        self.mode = mode
+        if mode == 'refuse':
+            # Stop listening so connections are refused
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+
+    def serve(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            if self.mode == 'stall':
+                # Keep a reference so the socket stays open and silent
+                self.stalled.append(client)
+            elif self.mode == 'proxy':
+                threading.Thread(target=self.proxy, args=(client,), daemon=True).start()
+            else:
+                client.close()
+
+    def proxy(self, client):
+        host, port = self.upstream.rsplit(':', 1)
+        try:
+            server = socket.create_connection((host, int(port)))
+        except OSError:
+            client.close()
+            return
+
+        def pipe(source, target):
+            try:
+                while self.mode == 'proxy':
+                    data = source.recv(65536)
+                    if not data:
+                        break
+                    target.sendall(data)
+            except OSError:
+                pass
+            finally:
+                source.close()
+                target.close()
+
+        threading.Thread(target=pipe, args=(client, server), daemon=True).start()
+        pipe(server, client)
+
+
+def timed_get(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    return response, time.perf_counter() - start
+
+
+def make_app(port, driver='mysqlclient', timeout=2, failures_to_open=3, query_timeout=None):
+    # timeout is the connect timeout; query_timeout defaults to the same
+    import app as appmod
+    return appmod.create_app({
+        'DB_BACKEND': 'mysql',
+        'MYSQL_DRIVER': driver,
+        'MYSQL_HOST': '127.0.0.1',
+        'MYSQL_PORT': port,
+        'DB_CONNECT_TIMEOUT_SECONDS': timeout,
+        'DB_QUERY_TIMEOUT_SECONDS': query_timeout or timeout,
+        'DB_BREAKER_FAILURES': failures_to_open,
+        'DB_BREAKER_RESET_SECONDS': 2,
+        'DB_BREAKER_MAX_RESET_SECONDS': 8,
+        'RATE_LIMIT_ENABLED': False,
+    })
+
+
+def check_outage(client, url, requests, failures_to_open, timeout):
+    # Requests made while the database is unreachable; returns the problems found
+    problems = []
+    for i in range(requests):
+        response, elapsed = timed_get(client, url)
+        stale = 'Warning' in response.headers
+        print(f"request {i + 1}: {response.status_code} in {elapsed * 1000:.0f}ms"
+              f"{' (stale)' if stale else ''} Retry-After={response.headers.get('Retry-After')}")
+        if response.status_code not in (200, 503) or (response.status_code == 200 and not stale):
+            problems.append(f"request {i + 1} returned {response.status_code} while the database was down")
+        if response.status_code == 503 and not response.headers.get('Retry-After'):
+            problems.append(f"request {i + 1} has no Retry-After header")
+        if i < failures_to_open and elapsed > timeout + 1:
+            problems.append(f"request {i + 1} took {elapsed:.1f}s, longer than the {timeout}s connect timeout")
+        if i >= failures_to_open and elapsed > timeout / 2:
+            problems.append(f"request {i + 1} took {elapsed:.1f}s, the breaker should have failed fast")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the database circuit breaker against a faulty server")
+    parser.add_argument('--mode', choices=['drop', 'stall', 'refuse'], default='stall')
+    parser.add_argument('--upstream', help="real MySQL host:port, enables the warm-up and recovery phases")
+    parser.add_argument('--driver', choices=['mysqlclient', 'mysql-connector'], default='mysqlclient')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--timeout', type=int, default=2, help="DB connect/query timeout in seconds")
+    args = parser.parse_args()
+
+    stub = StubServer(args.upstream)
+    failures_to_open = 3
+    application = make_app(stub.port, args.driver, args.timeout, failures_to_open)
+    client = application.test_client()
+    url = '/api/bookingSummary?year=2030&month=1'
+    problems = []
+
+    if args.upstream:
+        response, elapsed = timed_get(client, url)
+        print(f"warm-up: {response.status_code} in {elapsed * 1000:.0f}ms")
+        if response.status_code != 200:
+            problems.append("warm-up request against the upstream server failed")
+
+    stub.set_mode(args.mode)
+    print(f"stub is now in {args.mode} mode")
+    problems.extend(check_outage(client, url, args.requests, failures_to_open, args.timeout))
+
+    if args.upstream and args.mode != 'refuse':
+        stub.set_mode('proxy')
+        print("stub proxies to the upstream server again")
+        deadline = time.monotonic() + 30
+        while True:
+            response, elapsed = timed_get(client, url)
+            recovered = response.status_code == 200 and 'Warning' not in response.headers
+            print(f"recovery: {response.status_code} in {elapsed * 1000:.0f}ms")
+            if recovered:
+                break
+            if time.monotonic() > deadline:
+                problems.append("the breaker did not close after the server came back")
+                break
+            time.sleep(0.5)
+
+    if problems:
+        print('\nFAILED')
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print('\nOK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Measures how long a fresh worker takes to import the app, i.e. the cold
+# start paid by every gunicorn worker without --preload.
+#
+#   python scripts/measure_startup.py                      # this checkout
+#   python scripts/measure_startup.py --repo ../old-checkout
+#
+# Compare a checkout from before the app factory (which connects to MySQL at
+# import) with the current one, using the same .env for both.
+PROBE = (
+    "import time; start = time.perf_counter(); "
+    "import app; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure(repo, runs):
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', PROBE], cwd=repo,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise SystemExit(f"Importing app failed:\n{result.stderr}")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import (worker cold start) time")
+    parser.add_argument('--repo', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    timings = sorted(measure(args.repo, args.runs))
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"runs={len(timings)} median={statistics.median(timings) * 1000:.1f}ms "
+          f"p95={p95 * 1000:.1f}ms max={timings[-1] * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
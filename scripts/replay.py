@@ -0,0 +1,235 @@
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+# Replays traffic recorded by traffic.py against a local instance and compares
+# two builds.
+#
+#   TRAFFIC_RECORD_PATH=traffic/prod gunicorn app:app      # record
+#   python scripts/replay.py run 'traffic/prod.*.ndjson.gz' --target http://localhost:5000 \
+#       --admin-token "$TOKEN" --out baseline.ndjson.gz    # build A
+#   python scripts/replay.py run 'traffic/prod.*.ndjson.gz' --target http://localhost:5000 \
+#       --admin-token "$TOKEN" --out candidate.ndjson.gz   # build B
+#   python scripts/replay.py compare baseline.ndjson.gz candidate.ndjson.gz
+#
+# Reset the database to the same snapshot before each run, otherwise the two
+# builds see different data and responses won't match. --speed 1 keeps the
+# recorded pacing, --speed 5 plays it five times faster and --speed 0 sends
+# requests as fast as --concurrency allows.
+
+# Values generated per run, ignored when comparing responses
+VOLATILE_FIELDS = {'ref_number', 'ref_num', 'token', 'version'}
+
+
+def load_records(patterns):
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        raise SystemExit(f"No recordings match {' '.join(patterns)}")
+    records = []
+    for path in paths:
+        with gzip.open(path, 'rt') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    # Workers write separate files, so merge them back into arrival order
+    records.sort(key=lambda r: r['ts'])
+    return records
+
+
+def normalize(value):
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    return value
+
+
+def fingerprint(body):
+    try:
+        body = json.dumps(normalize(json.loads(body)), sort_keys=True).encode()
+    except ValueError:
+        pass
+    return hashlib.sha256(body).hexdigest()[:16]
+
+
+class Replayer:
+    def __init__(self, target, admin_token=None, timeout=30):
+        self.target = target.rstrip('/')
+        self.admin_token = admin_token
+        self.timeout = timeout
+        # Booking references in the recording don't exist in the replayed
+        # database; map them to the ones created during this run
+        self.refs = {}
+        self.refs_lock = threading.Lock()
+
+    def map_ref(self, value):
+        with self.refs_lock:
+            return self.refs.get(value, value)
+
+    def remap(self, value, field=None):
+        if isinstance(value, dict):
+            return {k: self.remap(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.remap(v, field) for v in value]
+        if field == 'ref_num':
+            return self.map_ref(value)
+        return value
+
+    def send(self, index, record):
+        query = urlencode([(k, self.remap(v, k)) for k, v in parse_qsl(record['q'], keep_blank_values=True)])
+        url = self.target + record['p'] + (f"?{query}" if query else '')
+        data = None
+        headers = {}
+        if 'b' in record:
+            data = json.dumps(self.remap(record['b'])).encode()
+            headers['Content-Type'] = 'application/json'
+        if record.get('auth') and self.admin_token:
+            headers['Authorization'] = f"Bearer {self.admin_token}"
+
+        req = urllib.request.Request(url, data=data, headers=headers, method=record['m'])
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                status, body = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            status, body = 0, str(e).encode()
+        latency = (time.perf_counter() - start) * 1000
+
+        if record.get('ref') and status < 300:
+            try:
+                new_ref = json.loads(body).get('ref_number')
+            except (ValueError, AttributeError):
+                new_ref = None
+            if new_ref:
+                with self.refs_lock:
+                    self.refs[record['ref']] = new_ref
+
+        return {
+            "i": index,
+            "m": record['m'],
+            "p": record['p'],
+            "s": status,
+            "ms": round(latency, 2),
+            "h": fingerprint(body),
+            "rec_s": record.get('s'),
+            "rec_ms": record.get('ms'),
+        }
+
+    def run(self, records, speed, concurrency):
+        if not records:
+            return []
+        t0 = records[0]['ts']
+        start = time.monotonic()
+        futures = []
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for index, record in enumerate(records):
+                if speed > 0:
+                    delay = (record['ts'] - t0) / speed - (time.monotonic() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(pool.submit(self.send, index, record))
+        return [future.result() for future in futures]
+
+
+def load_results(path):
+    with gzip.open(path, 'rt') as f:
+        return {r['i']: r for r in (json.loads(line) for line in f if line.strip())}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def endpoint(result):
+    return f"{result['m']} {result['p']}"
+
+
+def compare(baseline, candidate, max_regression=None):
+    by_endpoint = {}
+    for index, a in baseline.items():
+        b = candidate.get(index)
+        if b is None:
+            continue
+        stats = by_endpoint.setdefault(endpoint(a), {'a': [], 'b': [], 'status': 0, 'body': 0})
+        stats['a'].append(a['ms'])
+        stats['b'].append(b['ms'])
+        if a['s'] != b['s']:
+            stats['status'] += 1
+        elif a['h'] != b['h']:
+            stats['body'] += 1
+
+    print(f"{'endpoint':<40} {'n':>6} {'p50 A':>8} {'p50 B':>8} {'p99 A':>8} {'p99 B':>8} "
+          f"{'p99 Δ':>7} {'status≠':>8} {'body≠':>6}")
+    regressions = []
+    for name, stats in sorted(by_endpoint.items()):
+        p99_a, p99_b = percentile(stats['a'], 99), percentile(stats['b'], 99)
+        change = (p99_b - p99_a) / p99_a * 100 if p99_a else 0.0
+        print(f"{name:<40} {len(stats['a']):>6} {percentile(stats['a'], 50):>8.1f} "
+              f"{percentile(stats['b'], 50):>8.1f} {p99_a:>8.1f} {p99_b:>8.1f} {change:>+6.0f}% "
+              f"{stats['status']:>8} {stats['body']:>6}")
+        if max_regression is not None and change > max_regression:
+            regressions.append(name)
+
+    missing = len(set(baseline) ^ set(candidate))
+    mismatches = sum(s['status'] + s['body'] for s in by_endpoint.values())
+    if missing:
+        print(f"{missing} requests only appear in one of the runs")
+    print(f"{mismatches} responses differ")
+    if regressions:
+        print(f"p99 regressed by more than {max_regression:.0f}%: {', '.join(regressions)}")
+    return not mismatches and not regressions and not missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded traffic and compare builds")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="replay recordings against a running instance")
+    run_parser.add_argument('recordings', nargs='+', help="recording files or glob patterns")
+    run_parser.add_argument('--target', default='http://localhost:5000')
+    run_parser.add_argument('--speed', type=float, default=1.0,
+                            help="1 = recorded pacing, 2 = twice as fast, 0 = no pacing")
+    run_parser.add_argument('--concurrency', type=int, default=32)
+    run_parser.add_argument('--admin-token', default=os.getenv('REPLAY_ADMIN_TOKEN'),
+                            help="JWT sent on requests that were recorded with Authorization")
+    run_parser.add_argument('--timeout', type=float, default=30)
+    run_parser.add_argument('--limit', type=int, help="replay only the first N requests")
+    run_parser.add_argument('--out', required=True, help="results file (.ndjson.gz)")
+
+    compare_parser = commands.add_parser('compare', help="compare the results of two runs")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--max-p99-regression', type=float,
+                                help="fail if any endpoint's p99 grows by more than this percent")
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        records = load_records(args.recordings)[:args.limit]
+        replayer = Replayer(args.target, args.admin_token, args.timeout)
+        start = time.monotonic()
+        results = replayer.run(records, args.speed, args.concurrency)
+        elapsed = time.monotonic() - start
+        with gzip.open(args.out, 'wt') as f:
+            for result in results:
+                f.write(json.dumps(result, separators=(',', ':')) + '\n')
+        errors = sum(1 for r in results if r['s'] == 0 or r['s'] >= 500)
+        print(f"Replayed {len(results)} requests in {elapsed:.1f}s, {errors} errors, results in {args.out}")
+    elif args.command == 'compare':
+        ok = compare(load_results(args.baseline), load_results(args.candidate), args.max_p99_regression)
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Venue-keyed sharding.
+#
+# Every venue lives on exactly one shard (a database). Shards are configured
+# with DB_SHARDS, a JSON object of per-shard overrides of the database
+# settings in load_config(), e.g.
+#   DB_SHARDS='{"east": {"MYSQL_HOST": "db-east", "MYSQL_DB": "booking_east"},
+#               "local": {"DB_BACKEND": "sqlite", "SQLITE_PATH": "local.db"}}'
+# and venues are mapped to shards with VENUE_SHARDS, e.g.
+#   VENUE_SHARDS='{"city": "east", "harbour": "east", "pier": "local"}'
+# The "default" shard is the database configured by the MYSQL_* settings and
+# always holds DEFAULT_VENUE (unless it is mapped elsewhere), OTPs and admins.
+DEFAULT_SHARD = 'default'
+
+
+def venues(config):
+    return list(dict.fromkeys([config['DEFAULT_VENUE'], *config['VENUE_SHARDS']]))
+
+
+def venue_shard(config, venue_id):
+    # Shard name of a venue, or None for an unknown venue
+    if venue_id in config['VENUE_SHARDS']:
+        return config['VENUE_SHARDS'][venue_id]
+    if venue_id == config['DEFAULT_VENUE']:
+        return DEFAULT_SHARD
+    return None
+
+
+def shard_names(config):
+    # Shards that hold at least one venue
+    return list(dict.fromkeys(venue_shard(config, venue_id) for venue_id in venues(config)))
+
+
+def shard_venues(config, shard):
+    return [venue_id for venue_id in venues(config) if venue_shard(config, venue_id) == shard]
+
+
+def shard_config(config, shard):
+    # Database settings of one shard: the base settings plus its overrides
+    if shard != DEFAULT_SHARD and shard not in config['DB_SHARDS']:
+        raise KeyError(f"Shard {shard} is not configured in DB_SHARDS")
+    merged = dict(config)
+    merged.update(config['DB_SHARDS'].get(shard, {}))
+    return merged
+
+
+def scatter(config, fn, shards=None):
+    # Runs fn(shard) on every shard in parallel and returns {shard: result}.
+    # fn opens its own connection; exceptions are raised to the caller.
+    shards = shards or shard_names(config)
+    if len(shards) == 1:
+        return {shards[0]: fn(shards[0])}
+    workers = min(len(shards), config['SHARD_QUERY_WORKERS'])
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {shard: pool.submit(fn, shard) for shard in shards}
+        return {shard: future.result() for shard, future in futures.items()}
@@ -0,0 +1,71 @@
+import datetime
+import os
+import sqlite3
+import sys
+
+import jwt
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app as appmod  # noqa: E402
+import circuit  # noqa: E402
+import events  # noqa: E402
+import rate_limit  # noqa: E402
+import schedule  # noqa: E402
+
+# The suite runs against the SQLite backend (booking_system.sqlite.sql), one
+# fresh database file per test.
+
+
+@pytest.fixture(autouse=True)
+def reset_process_state():
+    # Per-process caches would otherwise leak between tests' databases
+    rate_limit._backend = None
+    events._broker = None
+    circuit._stale.clear()
+    schedule._cache.clear()
+    appmod._readiness.update(checked_at=0, result=None)
+    yield
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    path = str(tmp_path / 'booking_system.db')
+    db = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'booking_system.sqlite.sql')) as f:
+        db.executescript(f.read())
+    db.close()
+    return path
+
+
+@pytest.fixture
+def app(sqlite_path):
+    return appmod.create_app({
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': sqlite_path,
+        'JWT_SECRET_KEY': 'test-secret-key-with-enough-bytes',
+    })
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers(app):
+    token = jwt.encode({
+        'admin_id': 1,
+        'username': 'admin',
+        'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    }, app.config['JWT_SECRET_KEY'])
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def db(sqlite_path):
+    conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+    yield conn
+    conn.close()
@@ -0,0 +1,29 @@
+import archive
+
+COLUMNS = ['ref_num', 'phone', 'email', 'bkg_date', 'bkg_time', 'family_name', 'table_num', 'venue_id']
+ROW = ('AAAAAA', '1', 'a@example.com', '2020-01-06', '10:00:00', 'Lee', 0, 'default')
+
+
+def test_written_month_is_only_listed_once_recorded(tmp_path):
+    archive_dir = str(tmp_path)
+    entry = archive.write_month('booking', '2020-01', COLUMNS, [ROW], archive_dir)
+
+    assert entry['rows'] == 1
+    assert archive.archived_months('booking', archive_dir) == []
+    assert list(archive.read_month('booking', '2020-01', archive_dir)) == []
+
+    archive.record_month('booking', (2020, 1), entry, archive_dir)
+    assert archive.archived_months('booking', archive_dir) == ['2020-01']
+    assert [row['ref_num'] for row in archive.read_month('booking', '2020-01', archive_dir)] == ['AAAAAA']
+
+
+def test_admin_listing_reads_the_configured_archive_dir(app, client, admin_headers, tmp_path):
+    archive_dir = str(tmp_path / 'cold')
+    app.config['ARCHIVE_DIR'] = archive_dir
+    entry = archive.write_month('booking', '2020-01', COLUMNS, [ROW], archive_dir)
+    archive.record_month('booking', '2020-01', entry, archive_dir)
+
+    response = client.get('/api/admin/bookings?archived_months=2020-01', headers=admin_headers)
+    assert response.status_code == 200
+    booking, = response.get_json()
+    assert booking['ref_num'] == 'AAAAAA' and booking['archived'] is True
@@ -0,0 +1,103 @@
+import sqlite3
+import threading
+
+from repository import BookingRepo
+
+
+def changes(client, headers, since=None):
+    url = '/api/admin/bookings/changes' + (f'?since={since}' if since is not None else '')
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def write_booking(db, ref_num):
+    bookings = BookingRepo(db, 'default')
+    bookings.create(ref_num, '1', 'a@example.com', '2030-05-03', '10:00', 'Lee', 0)
+    version = bookings.record_change(ref_num, 'upsert')
+    bookings.close()
+    return version
+
+
+def test_token_does_not_pass_an_uncommitted_change(client, admin_headers, sqlite_path):
+    # Two booking transactions interleave with a dashboard polling between
+    # them. SQLite serialises writers on the database lock; on MySQL the
+    # booking_sync row lock taken by record_change does the same per venue.
+    token = changes(client, admin_headers)['version']
+    first = sqlite3.connect(sqlite_path, timeout=5, check_same_thread=False)
+    second = sqlite3.connect(sqlite_path, timeout=5, check_same_thread=False)
+    recorded = threading.Event()
+    release = threading.Event()
+    versions = {}
+
+    def second_transaction():
+        versions['second'] = write_booking(second, 'BBBBBB')
+        recorded.set()
+        release.wait(5)
+        second.commit()
+
+    try:
+        versions['first'] = write_booking(first, 'AAAAAA')
+        thread = threading.Thread(target=second_transaction)
+        thread.start()
+
+        # Neither transaction has committed
+        response = changes(client, admin_headers, token)
+        assert response['bookings'] == [] and response['version'] == token
+
+        first.commit()
+        assert recorded.wait(5)
+        response = changes(client, admin_headers, token)
+        assert [b['ref_num'] for b in response['bookings']] == ['AAAAAA']
+        token = response['version']
+
+        release.set()
+        thread.join(5)
+        response = changes(client, admin_headers, token)
+        assert [b['ref_num'] for b in response['bookings']] == ['BBBBBB']
+        assert versions['first'] < versions['second'] == response['version']
+    finally:
+        release.set()
+        first.close()
+        second.close()
+
+
+def test_snapshot_token_covers_the_snapshot(client, admin_headers):
+    client.post('/api/bkgSession', json={'year': 2030, 'month': 5, 'slot_limit': 3})
+    client.post('/api/makeBooking', json={
+        'bkg_date': '2030-05-03', 'bkg_time': '10:00', 'phone': '1', 'email': 'a@example.com', 'family_name': 'Lee'})
+
+    snapshot = changes(client, admin_headers)
+    assert len(snapshot['bookings']) == 1
+    assert changes(client, admin_headers, snapshot['version'])['bookings'] == []
+
+
+def test_page_size_comes_from_the_app_config(app, client, admin_headers):
+    app.config['CHANGES_PAGE_SIZE'] = 1
+    client.post('/api/bkgSession', json={'year': 2030, 'month': 5, 'slot_limit': 3})
+    for day in ('2030-05-03', '2030-05-04'):
+        client.post('/api/makeBooking', json={
+            'bkg_date': day, 'bkg_time': '10:00', 'phone': '1', 'email': 'a@example.com', 'family_name': 'Lee'})
+
+    response = changes(client, admin_headers, 0)
+    assert len(response['bookings']) == 1 and response['has_more']
+
+
+def test_token_older_than_an_emptied_log_is_gone(client, admin_headers, db):
+    stale = changes(client, admin_headers)['version']
+    write_booking(db, 'AAAAAA')
+    db.commit()
+    latest = changes(client, admin_headers, stale)['version']
+    # purge-changes trimmed the whole log
+    db.execute("DELETE FROM booking_change")
+    db.commit()
+
+    response = client.get(f'/api/admin/bookings/changes?since={stale}', headers=admin_headers)
+    assert response.status_code == 410
+    assert changes(client, admin_headers, latest)['bookings'] == []
+
+
+def test_token_ahead_of_the_latest_version_is_gone(client, admin_headers):
+    latest = changes(client, admin_headers)['version']
+    response = client.get(f'/api/admin/bookings/changes?since={latest + 5}', headers=admin_headers)
+    assert response.status_code == 410
@@ -0,0 +1,39 @@
+import app as appmod
+
+
+def make_booking(client, bkg_date):
+    return client.post('/api/makeBooking', json={
+        'bkg_date': bkg_date, 'bkg_time': '10:00', 'phone': '1', 'email': 'a@example.com', 'family_name': 'Lee'})
+
+
+def test_colliding_reference_is_drawn_again(client, monkeypatch):
+    client.post('/api/bkgSession', json={'year': 2030, 'month': 5, 'slot_limit': 3})
+    refs = iter(['AAAAAA', 'AAAAAA', 'BBBBBB'])
+    monkeypatch.setattr(appmod, 'generate_ref_number', lambda: next(refs))
+
+    first = make_booking(client, '2030-05-03')
+    second = make_booking(client, '2030-05-04')
+
+    assert first.get_json() == {'ref_number': 'AAAAAA'}
+    assert second.get_json() == {'ref_number': 'BBBBBB'}
+
+
+def test_cancelled_reference_is_not_reused(client, monkeypatch):
+    client.post('/api/bkgSession', json={'year': 2030, 'month': 5, 'slot_limit': 3})
+    refs = iter(['AAAAAA', 'AAAAAA', 'CCCCCC'])
+    monkeypatch.setattr(appmod, 'generate_ref_number', lambda: next(refs))
+
+    make_booking(client, '2030-05-03')
+    assert client.delete('/api/cancelBooking?ref_num=AAAAAA').status_code == 200
+    assert make_booking(client, '2030-05-04').get_json() == {'ref_number': 'CCCCCC'}
+
+
+def test_reference_allocation_gives_up(client, monkeypatch):
+    client.post('/api/bkgSession', json={'year': 2030, 'month': 5, 'slot_limit': 3})
+    monkeypatch.setattr(appmod, 'generate_ref_number', lambda: 'AAAAAA')
+
+    assert make_booking(client, '2030-05-03').status_code == 201
+    response = make_booking(client, '2030-05-04')
+    assert response.status_code == 500
+    # Nothing of the failed booking is left behind
+    assert len(client.get('/api/getAllBookings').get_json()) == 1
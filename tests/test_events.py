@@ -0,0 +1,74 @@
+import json
+import threading
+
+import events
+
+
+def test_stream_closed_before_it_starts_leaves_no_subscription(app, client):
+    response = client.get('/api/bookingSummary/stream?year=2030&month=5', buffered=False)
+    response.close()
+    assert events.get_broker(app.config).subscriber_count() == 0
+
+
+def test_stream_subscribes_until_closed(app, client):
+    response = client.get('/api/bookingSummary/stream?year=2030&month=5', buffered=False)
+    assert next(response.response).startswith(b'retry:')
+    assert events.get_broker(app.config).subscriber_count() == 1
+    response.close()
+    assert events.get_broker(app.config).subscriber_count() == 0
+
+
+class FlakyPubSub:
+    def __init__(self, items, fail):
+        self.items = items
+        self.fail = fail
+
+    def psubscribe(self, pattern):
+        pass
+
+    def listen(self):
+        if self.fail:
+            raise ConnectionError("Connection reset by peer")
+        yield from self.items
+        threading.Event().wait()
+
+    def close(self):
+        pass
+
+
+class FlakyRedis:
+    # The first connection drops, the second delivers one message
+    def __init__(self, message):
+        self.connections = iter([
+            FlakyPubSub([], fail=True),
+            FlakyPubSub([{'data': json.dumps(message)}], fail=False),
+        ])
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return next(self.connections)
+
+
+def test_listener_reconnects_and_asks_for_a_resync(monkeypatch):
+    monkeypatch.setattr(events, 'RECONNECT_SECONDS', 0.01)
+    broker = events.Broker()
+    subscription = broker.subscribe('availability:default:2030-05')
+    broker.redis = FlakyRedis({'topic': 'availability:default:2030-05', 'type': 'availability', 'data': {}})
+    threading.Thread(target=broker._listen, daemon=True).start()
+
+    assert subscription.get(timeout=2)['type'] == 'resync'
+    assert subscription.get(timeout=2)['type'] == 'availability'
+
+
+def test_schedule_change_resyncs_every_month_of_the_venue(app, client, admin_headers):
+    broker = events.get_broker(app.config)
+    may = broker.subscribe(events.availability_topic('default', 2030, 5))
+    june = broker.subscribe(events.availability_topic('default', 2030, 6))
+    elsewhere = broker.subscribe(events.availability_topic('other', 2030, 5))
+
+    response = client.put('/api/admin/schedule', headers=admin_headers, json={
+        'rules': [{'weekdays': [0], 'times': ['10:00'], 'slot_limit': 4}]})
+    assert response.status_code == 200
+
+    assert may.get_nowait()['type'] == 'resync'
+    assert june.get_nowait()['type'] == 'resync'
+    assert elsewhere.empty()
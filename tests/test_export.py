@@ -0,0 +1,66 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from repository import BookingRepo
+
+URL = '/api/admin/bookings/export?from=2020-01-01&to=2030-12-31'
+
+
+@pytest.fixture
+def bookings(db):
+    repo = BookingRepo(db, 'default')
+    repo.create('PAST01', '1', 'a@example.com', '2020-01-06', '10:00', 'Lee', 1)
+    repo.create('NEXT01', '2', 'b@example.com', '2030-05-03', '11:00', 'Kim', 2)
+    repo.create('NEXT02', '3', 'c@example.com', '2031-01-01', '11:00', 'Ng', 0)
+    db.commit()
+    repo.close()
+
+
+def test_csv_export(client, admin_headers, bookings):
+    response = client.get(URL, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == BookingRepo.COLUMNS
+    assert rows[1:] == [
+        ['PAST01', '1', 'a@example.com', '2020-01-06', '10:00', 'Lee', '1', 'default'],
+        ['NEXT01', '2', 'b@example.com', '2030-05-03', '11:00', 'Kim', '2', 'default']]
+
+
+def test_ndjson_export(client, admin_headers, bookings):
+    response = client.get(URL + '&format=ndjson', headers=admin_headers)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['ref_num'] for line in lines] == ['PAST01', 'NEXT01']
+    assert lines[1]['bkg_time'] == '11:00'
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'ndjson'])
+def test_gzip_export_decompresses(client, admin_headers, bookings, export_format):
+    plain = client.get(URL + f'&format={export_format}', headers=admin_headers).get_data()
+    response = client.get(URL + f'&format={export_format}&gzip=1', headers=admin_headers)
+    assert response.mimetype == 'application/gzip'
+    assert 'filename=' in response.headers['Content-Disposition']
+    assert gzip.decompress(response.get_data()) == plain
+
+
+@pytest.mark.parametrize('status, refs', [('all', ['PAST01', 'NEXT01']), ('past', ['PAST01']),
+                                          ('upcoming', ['NEXT01'])])
+def test_status_filter(client, admin_headers, bookings, status, refs):
+    response = client.get(URL + f'&format=ndjson&status={status}', headers=admin_headers)
+    assert [json.loads(line)['ref_num'] for line in response.get_data(as_text=True).splitlines()] == refs
+
+
+@pytest.mark.parametrize('query', [
+    '', '?from=2020-01-01', '?from=2020-01-01&to=2030-13-01', '?from=01/01/2020&to=2030-12-31',
+    '?from=2020-01-01&to=2030-12-31&format=xml', '?from=2020-01-01&to=2030-12-31&status=soon'])
+def test_bad_requests(client, admin_headers, query):
+    response = client.get('/api/admin/bookings/export' + query, headers=admin_headers)
+    assert response.status_code == 400
+
+
+def test_token_required(client):
+    assert client.get(URL).status_code == 401
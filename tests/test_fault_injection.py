@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+import fault_injection  # noqa: E402
+
+# The StubServer scenarios of scripts/fault_injection.py, with mysql-connector
+# (pure Python, so no MySQL client library is needed). The query timeout is
+# longer than the connect timeout, so a connect that waits for the query
+# timeout shows up as a slow request.
+pytest.importorskip('mysql.connector')
+
+URL = '/api/bookingSummary?year=2030&month=1'
+CONNECT_TIMEOUT = 1
+QUERY_TIMEOUT = 5
+FAILURES_TO_OPEN = 3
+
+
+@pytest.mark.parametrize('mode', ['drop', 'stall', 'refuse'])
+def test_breaker_fails_fast_while_the_database_is_down(mode):
+    stub = fault_injection.StubServer()
+    application = fault_injection.make_app(stub.port, 'mysql-connector', CONNECT_TIMEOUT, FAILURES_TO_OPEN,
+                                           query_timeout=QUERY_TIMEOUT)
+    stub.set_mode(mode)
+
+    problems = fault_injection.check_outage(application.test_client(), URL, FAILURES_TO_OPEN + 3,
+                                            FAILURES_TO_OPEN, CONNECT_TIMEOUT)
+    assert problems == []
@@ -0,0 +1,26 @@
+import datetime
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+from repository import BookingRepo, OccupancyRepo, SessionRepo, streaming_cursor
+
+
+def test_rollup_runs_on_sqlite(sqlite_path, db):
+    SessionRepo(db, 'default').create_month(2030, 5, ['10:00:00'], 3)
+    BookingRepo(db, 'default').create('AAAAAA', '1', 'a@example.com', '2030-05-07', '10:00', 'Lee', 0)
+    db.commit()
+
+    env = dict(os.environ, DB_BACKEND='sqlite', SQLITE_PATH=sqlite_path)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'maintenance.py'), 'rollup',
+                    '--from', '2030-05-01', '--to', '2030-05-31'], env=env, check=True, capture_output=True)
+
+    day = datetime.date(2030, 5, 7)
+    assert OccupancyRepo(db, 'default').days(day, day) == [(day, 1, 3)]
+
+
+def test_streaming_cursor_on_sqlite(db):
+    cur = streaming_cursor(db)
+    cur.execute("SELECT 1")
+    assert cur.fetchall() == [(1,)]
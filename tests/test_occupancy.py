@@ -0,0 +1,51 @@
+import pytest
+
+URL = '/api/admin/occupancy'
+
+
+@pytest.fixture
+def booked(client, admin_headers):
+    # Far enough ahead that the schedule change doesn't refresh these weeks:
+    # only the booking writes their rollups
+    client.put('/api/admin/schedule', headers=admin_headers, json={
+        'rules': [{'weekdays': list(range(7)), 'times': ['10:00', '11:00'], 'slot_limit': 2}]})
+    for bkg_date in ('2030-05-03', '2030-05-03', '2030-05-08'):
+        response = client.post('/api/makeBooking', json={
+            'bkg_date': bkg_date, 'bkg_time': '10:00', 'phone': '1', 'email': 'a@example.com', 'family_name': 'Lee'})
+        assert response.status_code == 201
+
+
+def periods(client, headers, date_from, date_to, grain):
+    response = client.get(f'{URL}?from={date_from}&to={date_to}&grain={grain}', headers=headers)
+    assert response.status_code == 200
+    return [(p['start'], p['booked'], p['capacity']) for p in response.get_json()['periods']]
+
+
+def test_every_day_of_a_booked_week_has_its_capacity(client, admin_headers, booked):
+    days = periods(client, admin_headers, '2030-04-29', '2030-05-12', 'day')
+    assert len(days) == 14
+    assert all(capacity == 4 for start, booked, capacity in days)
+    assert [(start, booked) for start, booked, capacity in days if booked] == [('2030-05-03', 2), ('2030-05-08', 1)]
+
+
+def test_grains_agree(client, admin_headers, booked):
+    assert periods(client, admin_headers, '2030-04-29', '2030-05-12', 'week') == [
+        ('2030-04-29', 2, 28), ('2030-05-06', 1, 28)]
+    assert periods(client, admin_headers, '2030-04-29', '2030-05-12', 'month') == [
+        ('2030-04-01', 0, 8), ('2030-05-01', 3, 48)]
+
+    response = client.get(f'{URL}?from=2030-05-06&to=2030-05-12&grain=week', headers=admin_headers)
+    assert response.get_json()['periods'][0]['utilisation'] == round(1 / 28, 4)
+
+
+@pytest.mark.parametrize('query', [
+    'from=2030-05-01&to=2030-05-31&grain=year',
+    'from=2030-05-01',
+    'from=01-05-2030&to=2030-05-31',
+])
+def test_bad_queries_are_rejected(client, admin_headers, query):
+    assert client.get(f'{URL}?{query}', headers=admin_headers).status_code == 400
+
+
+def test_requires_an_admin(client):
+    assert client.get(f'{URL}?from=2030-05-01&to=2030-05-31').status_code == 401
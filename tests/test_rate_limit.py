@@ -0,0 +1,69 @@
+import sys
+
+import rate_limit
+
+
+def booking(i):
+    return {'bkg_date': '2030-05-03', 'bkg_time': '10:00', 'phone': '1',
+            'email': f'user{i}@example.com', 'family_name': 'Lee'}
+
+
+def statuses(client, headers_for):
+    return [client.post('/api/makeBooking', json=booking(i), headers=headers_for(i),
+                        environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code
+            for i in range(15)]
+
+
+def test_forged_forwarded_for_is_ignored_behind_a_proxy(app, client):
+    app.config['RATE_LIMIT_TRUSTED_PROXIES'] = 1
+    # The client rotates the leftmost entry, the proxy appends the real address
+    codes = statuses(client, lambda i: {'X-Forwarded-For': f'1.2.3.{i}, 203.0.113.7'})
+    assert codes[10:] == [429] * 5
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(app, client):
+    app.config['RATE_LIMIT_TRUSTED_PROXIES'] = 0
+    codes = statuses(client, lambda i: {'X-Forwarded-For': f'1.2.3.{i}'})
+    assert codes[10:] == [429] * 5
+
+
+def test_clients_behind_the_proxy_are_limited_separately(app, client):
+    app.config['RATE_LIMIT_TRUSTED_PROXIES'] = 1
+    codes = statuses(client, lambda i: {'X-Forwarded-For': f'203.0.113.{i}'})
+    assert 429 not in codes
+
+
+def test_memory_backend_is_capped():
+    backend = rate_limit.MemoryBackend(max_keys=100)
+    for i in range(1000):
+        backend.consume(f'make_booking:email:user{i}', 5, 5 / 300)
+    assert len(backend.buckets) == 100
+    # The most recently used buckets are kept
+    assert 'make_booking:email:user999' in backend.buckets
+
+
+def test_limiter_can_be_switched_off_in_the_app_config(app, client):
+    app.config['RATE_LIMIT_ENABLED'] = False
+    assert 429 not in statuses(client, lambda i: {})
+
+
+class UnreachableRedis:
+    class RedisError(Exception):
+        pass
+
+    class Redis:
+        @classmethod
+        def from_url(cls, url):
+            return cls()
+
+        def register_script(self, script):
+            def run(keys, args):
+                raise UnreachableRedis.RedisError("Error 111 connecting to localhost:6379. Connection refused.")
+            return run
+
+
+def test_unreachable_redis_falls_back_to_worker_buckets(app, client, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'redis', UnreachableRedis)
+    app.config['RATE_LIMIT_STORAGE_URL'] = 'redis://localhost:6379/0'
+    codes = statuses(client, lambda i: {})
+    assert codes[:10] == [400] * 10 and codes[10:] == [429] * 5
@@ -0,0 +1,114 @@
+import datetime
+
+import pytest
+
+from repository import BookingRepo, OccupancyRepo, OtpRepo, SessionRepo
+
+
+@pytest.fixture
+def sessions(db):
+    repo = SessionRepo(db, 'default')
+    repo.create_month(2030, 5, ['10:00:00'], 3)
+    db.commit()
+    yield repo
+    repo.close()
+
+
+@pytest.fixture
+def bookings(db):
+    repo = BookingRepo(db, 'default')
+    yield repo
+    repo.close()
+
+
+def add_booking(bookings, ref_num, bkg_date='2030-05-03', bkg_time='10:00'):
+    bookings.create(ref_num, '0400000000', 'a@example.com', bkg_date, bkg_time, 'Lee', 1)
+
+
+def test_update_keeps_the_columns_it_is_not_given(bookings):
+    add_booking(bookings, 'AAAAAA')
+
+    assert bookings.update('AAAAAA', email='b@example.com') == 1
+    booking, = bookings.list_all()
+    assert booking == {
+        'ref_num': 'AAAAAA', 'phone': '0400000000', 'email': 'b@example.com', 'bkg_date': '2030-05-03',
+        'bkg_time': '10:00', 'family_name': 'Lee', 'table_num': 1, 'venue_id': 'default'}
+
+
+def test_update_moves_the_slot(bookings):
+    add_booking(bookings, 'AAAAAA')
+
+    bookings.update('AAAAAA', bkg_date='2030-05-04', bkg_time='11:00')
+    assert bookings.get_slot('AAAAAA') == (datetime.date(2030, 5, 4), '11:00:00')
+    assert bookings.update('ZZZZZZ', email='b@example.com') == 0
+
+
+def test_changes_since_reports_current_state_and_cancellations(bookings):
+    add_booking(bookings, 'AAAAAA')
+    first = bookings.record_change('AAAAAA', 'upsert')
+    add_booking(bookings, 'BBBBBB')
+    bookings.record_change('BBBBBB', 'upsert')
+    bookings.delete('AAAAAA')
+    last = bookings.record_change('AAAAAA', 'cancel')
+
+    assert bookings.change_bounds() == (first, last)
+    rows = bookings.changes_since(first - 1, 10)
+    assert [(version, ref_num, booking is None) for version, ref_num, booking in rows] == [
+        (first, 'AAAAAA', True), (first + 1, 'BBBBBB', False), (last, 'AAAAAA', True)]
+    assert [row[0] for row in bookings.changes_since(first, 1)] == [first + 1]
+
+
+def test_change_versions_are_per_venue(db, bookings):
+    other = BookingRepo(db, 'other')
+    add_booking(bookings, 'AAAAAA')
+    bookings.record_change('AAAAAA', 'upsert')
+    other.create('BBBBBB', '1', 'b@example.com', '2030-05-03', '10:00', 'Kim', 0)
+
+    assert other.record_change('BBBBBB', 'upsert') == 1
+    assert other.changes_since(0, 10)[0][1] == 'BBBBBB'
+    assert BookingRepo(db, 'empty').change_bounds() == (None, None)
+
+
+def test_availability_slot(sessions, bookings):
+    add_booking(bookings, 'AAAAAA')
+
+    assert sessions.availability_slot('2030-05-03', '10:00') == [(datetime.date(2030, 5, 3), '10:00:00', 2)]
+    assert sessions.availability_slot('2030-05-03', '11:00', for_update=True) == []
+
+
+def test_occupancy_add_upserts_days_and_weeks(sessions):
+    occupancy = OccupancyRepo(sessions.db, 'default')
+    monday = datetime.date(2030, 5, 6)
+
+    occupancy.add({monday: 1})
+    occupancy.add({monday: 1, monday + datetime.timedelta(days=1): 1})
+
+    assert occupancy.days(monday, monday + datetime.timedelta(days=1)) == [
+        (monday, 2, 3), (monday + datetime.timedelta(days=1), 1, 3)]
+    assert occupancy.weeks(monday, monday) == [(monday, 3, 21)]
+
+
+def test_occupancy_rebuild_recounts_from_bookings(sessions, bookings):
+    occupancy = OccupancyRepo(sessions.db, 'default')
+    monday = datetime.date(2030, 5, 6)
+    occupancy.add({monday: 5})
+    add_booking(bookings, 'AAAAAA', '2030-05-07')
+    add_booking(bookings, 'BBBBBB', '2030-05-07')
+
+    assert occupancy.rebuild(monday, monday + datetime.timedelta(days=1)) == 7
+    assert occupancy.days(monday, monday + datetime.timedelta(days=1)) == [
+        (monday, 0, 3), (monday + datetime.timedelta(days=1), 2, 3)]
+    assert occupancy.weeks(monday, monday) == [(monday, 2, 21)]
+
+
+def test_otp_is_single_use_and_replaced(db):
+    otps = OtpRepo(db)
+    expiry = datetime.datetime(2030, 1, 1, 12, 0)
+    now = expiry - datetime.timedelta(minutes=1)
+    otps.save('a@example.com', '111111', expiry)
+    otps.save('a@example.com', '222222', expiry)
+
+    assert not otps.verify('a@example.com', '111111', now)
+    assert otps.verify('a@example.com', '222222', now)
+    assert not otps.verify('a@example.com', '222222', now)
+    assert not otps.verify('a@example.com', '333333', expiry + datetime.timedelta(minutes=1))
@@ -0,0 +1,105 @@
+import datetime
+
+import pytest
+
+from schedule import Schedule
+
+MONDAY = datetime.date(2030, 5, 6)
+
+
+def test_latest_valid_from_wins():
+    schedule = Schedule([
+        (0, '10:00:00', 5, None, None),
+        (0, '10:00:00', 8, datetime.date(2030, 5, 1), None),
+        (0, '10:00:00', 2, datetime.date(2030, 4, 1), None),
+    ], [])
+    assert schedule.day(MONDAY) == {'10:00:00': 8}
+    assert schedule.day(MONDAY - datetime.timedelta(weeks=2)) == {'10:00:00': 2}
+    assert schedule.day(MONDAY - datetime.timedelta(weeks=6)) == {'10:00:00': 5}
+
+
+def test_rule_ends_after_valid_to():
+    schedule = Schedule([
+        (0, '10:00:00', 5, None, None),
+        (0, '10:00:00', 8, datetime.date(2030, 5, 1), MONDAY),
+        (0, '11:00:00', 3, None, MONDAY),
+    ], [])
+    assert schedule.day(MONDAY) == {'10:00:00': 8, '11:00:00': 3}
+    assert schedule.day(MONDAY + datetime.timedelta(weeks=1)) == {'10:00:00': 5}
+
+
+def test_exceptions_close_a_day_or_a_single_slot():
+    schedule = Schedule([(0, '10:00:00', 5, None, None), (0, '11:00:00', 5, None, None)], [
+        (MONDAY, None, 'Holiday'),
+        (MONDAY + datetime.timedelta(weeks=1), '11:00:00', 'Early close'),
+    ])
+    assert schedule.day(MONDAY) == {}
+    assert schedule.day(MONDAY + datetime.timedelta(weeks=1)) == {'10:00:00': 5}
+    assert schedule.day(MONDAY + datetime.timedelta(weeks=2)) == {'10:00:00': 5, '11:00:00': 5}
+
+
+def test_bkgsession_rows_override_rules_and_exceptions():
+    schedule = Schedule([(0, '10:00:00', 5, None, None)], [(MONDAY, None, 'Holiday')])
+    tuesday = MONDAY + datetime.timedelta(days=1)
+    sessions = schedule.sessions(MONDAY - datetime.timedelta(days=7), MONDAY + datetime.timedelta(days=2), [
+        (MONDAY, '12:00:00', 4),
+        (tuesday, '10:00:00', 0),
+        (MONDAY - datetime.timedelta(days=7), '10:00:00', 9),
+    ])
+    assert sessions == [
+        (MONDAY - datetime.timedelta(days=7), '10:00:00', 9),
+        (MONDAY, '12:00:00', 4),
+        (tuesday, '10:00:00', 0),
+    ]
+
+
+@pytest.mark.parametrize('body', [
+    {'rules': [{'weekdays': [7], 'times': ['10:00']}]},
+    {'rules': [{'weekdays': [], 'times': ['10:00']}]},
+    {'rules': [{'weekdays': [0], 'times': []}]},
+    {'rules': [{'weekdays': [0], 'times': ['25:00']}]},
+    {'rules': [{'weekdays': [0], 'times': ['10:00'], 'slot_limit': -1}]},
+    {'rules': [{'weekdays': [0], 'times': ['10:00'], 'valid_from': '2030-13-01'}]},
+    {'rules': [{'weekdays': ['Monday'], 'times': ['10:00']}]},
+    {'exceptions': [{'reason': 'No date'}]},
+    {'exceptions': [{'date': '06-05-2030'}]},
+    {'exceptions': [{'date': '2030-05-06', 'time': 'noon'}]},
+])
+def test_put_rejects_an_invalid_schedule(client, admin_headers, body):
+    response = client.put('/api/admin/schedule', headers=admin_headers, json=body)
+    assert response.status_code == 400
+
+
+def test_put_replaces_the_schedule(client, admin_headers):
+    response = client.put('/api/admin/schedule', headers=admin_headers, json={
+        'rules': [{'weekdays': [0, 1], 'times': ['10:00', '09:00'], 'slot_limit': 4},
+                  {'weekdays': [0], 'times': ['10:00'], 'slot_limit': 8,
+                   'valid_from': '2030-05-01', 'valid_to': '2030-05-31'}],
+        'exceptions': [{'date': '2030-05-13', 'reason': 'Holiday'}]})
+    assert response.status_code == 200
+    assert response.get_json()['rules'] == [
+        {'weekdays': [0], 'times': ['09:00', '10:00'], 'slot_limit': 4, 'valid_from': None, 'valid_to': None},
+        {'weekdays': [0], 'times': ['10:00'], 'slot_limit': 8, 'valid_from': '2030-05-01', 'valid_to': '2030-05-31'},
+        {'weekdays': [1], 'times': ['09:00', '10:00'], 'slot_limit': 4, 'valid_from': None, 'valid_to': None}]
+
+    summary = client.get('/api/bookingSummary?year=2030&month=5').get_json()
+    assert summary['06-05-2030'] == {'09:00': 4, '10:00': 8}
+    assert '13-05-2030' not in summary
+
+
+def test_put_replaces_a_cached_schedule(client, admin_headers, db):
+    client.put('/api/admin/schedule', headers=admin_headers, json={
+        'rules': [{'weekdays': list(range(7)), 'times': ['10:00'], 'slot_limit': 4}]})
+    today = datetime.date.today()
+    # Caches the current rules in this worker
+    client.get(f'/api/bookingSummary?year={today.year}&month={today.month}')
+
+    client.put('/api/admin/schedule', headers=admin_headers, json={
+        'rules': [{'weekdays': list(range(7)), 'times': ['10:00'], 'slot_limit': 6}]})
+
+    summary = client.get(f'/api/bookingSummary?year={today.year}&month={today.month}').get_json()
+    assert summary[today.strftime('%d-%m-%Y')]['10:00'] == 6
+    # The capacity refresh read the new rules, not the cached ones
+    capacity = db.execute("SELECT capacity FROM occupancy_daily WHERE venue_id = 'default' AND day = ?",
+                          (today.isoformat(),)).fetchone()[0]
+    assert capacity == 6
@@ -0,0 +1,28 @@
+import pytest
+
+
+@pytest.mark.parametrize('month', ['0', '13', 'May'])
+def test_booking_summary_rejects_a_bad_month(client, month):
+    response = client.get(f'/api/bookingSummary?year=2030&month={month}')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('month', [0, 13, 'May'])
+def test_get_bkg_session_rejects_a_bad_month(client, month):
+    response = client.get('/api/getBkgSession', json={'year': 2030, 'month': month})
+    assert response.status_code == 400
+
+
+def test_bkg_session_rejects_a_bad_month(client):
+    response = client.post('/api/bkgSession', json={'year': 2030, 'month': 13})
+    assert response.status_code == 400
+
+
+def test_booking_summary_counts_bookings(client):
+    client.post('/api/bkgSession', json={'year': 2030, 'month': 5, 'slot_limit': 3})
+    client.post('/api/makeBooking', json={
+        'bkg_date': '2030-05-03', 'bkg_time': '10:00', 'phone': '1', 'email': 'a@example.com', 'family_name': 'Lee'})
+
+    summary = client.get('/api/bookingSummary?year=2030&month=5').get_json()
+    assert summary['03-05-2030']['10:00'] == 2
+    assert summary['04-05-2030']['10:00'] == 3
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+
+import pytest
+
+from conftest import ROOT
+
+
+def make_database(path):
+    db = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'booking_system.sqlite.sql')) as f:
+        db.executescript(f.read())
+    db.close()
+    return path
+
+
+@pytest.fixture
+def east_path(tmp_path):
+    return make_database(str(tmp_path / 'east.db'))
+
+
+@pytest.fixture
+def sharded(app, east_path):
+    # "default" stays on the default shard, "harbour" lives on "east"
+    app.config['DB_SHARDS'] = {'east': {'DB_BACKEND': 'sqlite', 'SQLITE_PATH': east_path}}
+    app.config['VENUE_SHARDS'] = {'harbour': 'east'}
+    return app
+
+
+def book(client, venue_id, bkg_date, family_name):
+    client.post('/api/bkgSession', json={'venue_id': venue_id, 'year': 2030, 'month': 5, 'slot_limit': 3})
+    response = client.post('/api/makeBooking', json={
+        'venue_id': venue_id, 'bkg_date': bkg_date, 'bkg_time': '10:00',
+        'phone': '1', 'email': 'a@example.com', 'family_name': family_name})
+    assert response.status_code == 201
+    return response
+
+
+def venues_on(path):
+    db = sqlite3.connect(path)
+    try:
+        return sorted({row[0] for row in db.execute("SELECT venue_id FROM booking")})
+    finally:
+        db.close()
+
+
+def test_bookings_are_written_to_the_venue_shard(sharded, client, sqlite_path, east_path):
+    book(client, 'default', '2030-05-03', 'Lee')
+    book(client, 'harbour', '2030-05-04', 'Kim')
+
+    assert venues_on(sqlite_path) == ['default']
+    assert venues_on(east_path) == ['harbour']
+    summary = client.get('/api/bookingSummary?venue_id=harbour&year=2030&month=5').get_json()
+    assert summary['04-05-2030']['10:00'] == 2 and summary['03-05-2030']['10:00'] == 3
+
+
+def test_unknown_venue_is_not_found(sharded, client, admin_headers):
+    response = client.get('/api/bookingSummary?venue_id=nowhere&year=2030&month=5')
+    assert response.status_code == 404
+    response = client.post('/api/makeBooking', json={
+        'venue_id': 'nowhere', 'bkg_date': '2030-05-03', 'bkg_time': '10:00',
+        'phone': '1', 'email': 'a@example.com', 'family_name': 'Lee'})
+    assert response.status_code == 404
+    response = client.get('/api/admin/bookings?venue_id=nowhere', headers=admin_headers)
+    assert response.status_code == 404
+
+
+def test_admin_bookings_merge_the_shards(sharded, client, admin_headers):
+    book(client, 'harbour', '2030-05-03', 'Kim')
+    book(client, 'default', '2030-05-04', 'Lee')
+    book(client, 'harbour', '2030-05-05', 'Ng')
+
+    bookings = client.get('/api/admin/bookings', headers=admin_headers).get_json()
+    assert [(b['bkg_date'], b['venue_id'], b['family_name']) for b in bookings] == [
+        ('2030-05-03', 'harbour', 'Kim'),
+        ('2030-05-04', 'default', 'Lee'),
+        ('2030-05-05', 'harbour', 'Ng')]
+
+    bookings = client.get('/api/admin/bookings?venue_id=harbour', headers=admin_headers).get_json()
+    assert [b['family_name'] for b in bookings] == ['Kim', 'Ng']
+
+
+def test_readiness_checks_every_shard(sharded, client):
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    checks = response.get_json()['checks']
+    assert checks['database'] == {'ok': True} and checks['database:east'] == {'ok': True}
+
+
+def test_one_unreachable_shard_fails_readiness(sharded, client, tmp_path):
+    sharded.config['DB_SHARDS']['east']['SQLITE_PATH'] = str(tmp_path / 'missing' / 'east.db')
+
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    checks = response.get_json()['checks']
+    assert checks['database']['ok']
+    assert not checks['database:east']['ok']
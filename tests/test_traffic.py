@@ -0,0 +1,41 @@
+import glob
+import gzip
+import hashlib
+import json
+
+import app as appmod
+import traffic
+
+
+def record_requests(tmp_path, sqlite_path, secret, emails):
+    path = str(tmp_path / secret / 'traffic')
+    application = appmod.create_app({
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': sqlite_path,
+        'TRAFFIC_RECORD_PATH': path,
+        'TRAFFIC_RECORD_SECRET': secret,
+    })
+    client = application.test_client()
+    for email in emails:
+        client.post('/api/updateBooking', json={'ref_num': 'AAAAAA', 'email': email}).get_data()
+    application.wsgi_app.close()
+    with gzip.open(glob.glob(path + '.*.ndjson.gz')[0], 'rt') as f:
+        return [json.loads(line)['b']['email'] for line in f]
+
+
+def test_pseudonyms_are_keyed(tmp_path, sqlite_path):
+    first, again, other = record_requests(tmp_path, sqlite_path, 'one',
+                                          ['a@example.com', 'a@example.com', 'b@example.com'])
+    rekeyed, = record_requests(tmp_path, sqlite_path, 'two', ['a@example.com'])
+
+    assert first == again != other
+    assert first != rekeyed
+    # An unkeyed hash of a guessed address doesn't give the pseudonym away
+    assert hashlib.sha256(b'email:a@example.com').hexdigest()[:12] not in first
+
+
+def test_recorder_without_a_secret_draws_a_key():
+    first = traffic.TrafficRecorder(None, 'unused')
+    second = traffic.TrafficRecorder(None, 'unused')
+    assert traffic.pseudonym('email', 'a@example.com', first.key) \
+        != traffic.pseudonym('email', 'a@example.com', second.key)
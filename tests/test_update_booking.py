@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+
+from repository import LockConflict, OccupancyRepo, Repo, SessionRepo
+
+
+def make_booking(client, bkg_date, bkg_time='10:00'):
+    response = client.post('/api/makeBooking', json={
+        'bkg_date': bkg_date, 'bkg_time': bkg_time, 'phone': '1', 'email': 'a@example.com', 'family_name': 'Lee'})
+    return response.get_json()['ref_number']
+
+
+@pytest.fixture
+def sessions(client):
+    client.post('/api/bkgSession', json={'year': 2030, 'month': 5, 'slot_limit': 1})
+
+
+def test_move_into_a_full_session_is_refused(client, sessions):
+    make_booking(client, '2030-05-03')
+    ref_num = make_booking(client, '2030-05-04')
+
+    response = client.put('/api/updateBooking', json={'ref_num': ref_num, 'bkg_date': '2030-05-03'})
+    assert response.status_code == 409
+    assert client.get('/api/bookingSummary?year=2030&month=5').get_json()['04-05-2030']['10:00'] == 0
+
+
+def test_move_to_a_missing_session_is_refused(client, sessions):
+    ref_num = make_booking(client, '2030-05-03')
+
+    response = client.put('/api/updateBooking', json={'ref_num': ref_num, 'bkg_time': '08:00'})
+    assert response.status_code == 400
+
+
+def test_move_updates_availability_and_occupancy(client, sessions, db):
+    ref_num = make_booking(client, '2030-05-03')
+
+    response = client.put('/api/updateBooking', json={'ref_num': ref_num, 'bkg_date': '2030-05-04'})
+    assert response.status_code == 201
+    summary = client.get('/api/bookingSummary?year=2030&month=5').get_json()
+    assert summary['03-05-2030']['10:00'] == 1
+    assert summary['04-05-2030']['10:00'] == 0
+    days = OccupancyRepo(db, 'default').days(datetime.date(2030, 5, 3), datetime.date(2030, 5, 4))
+    assert [booked for day, booked, capacity in days] == [0, 1]
+
+
+def test_lock_conflict_is_a_clean_409(client, sessions, monkeypatch):
+    def deadlock(*args, **kwargs):
+        raise LockConflict("Deadlock found when trying to get lock")
+    monkeypatch.setattr(SessionRepo, 'availability_slot', deadlock)
+
+    response = client.post('/api/makeBooking', json={
+        'bkg_date': '2030-05-03', 'bkg_time': '10:00', 'phone': '1', 'email': 'a@example.com', 'family_name': 'Lee'})
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize('code', [1205, 1213])
+def test_mysql_lock_errors_become_lock_conflicts(db, code):
+    def fail():
+        raise Exception(code, "Lock wait timeout exceeded")
+
+    with pytest.raises(LockConflict):
+        Repo(db).run(fail)
+
+
+def test_lock_conflicts_of_other_writes_are_a_clean_409(client, sessions, admin_headers, monkeypatch):
+    ref_num = make_booking(client, '2030-05-03')
+
+    def deadlock(*args, **kwargs):
+        raise LockConflict("Deadlock found when trying to get lock")
+    monkeypatch.setattr(OccupancyRepo, 'add', deadlock)
+
+    assert client.delete(f'/api/cancelBooking?ref_num={ref_num}').status_code == 409
+    assert client.post('/api/bkgSession', json={'year': 2030, 'month': 6}).status_code == 409
+    response = client.put('/api/admin/schedule', headers=admin_headers, json={
+        'rules': [{'weekdays': [0], 'times': ['10:00'], 'slot_limit': 4}]})
+    assert response.status_code == 409
+
+    # Rolled back: the booking is still there and the schedule unchanged
+    assert client.get('/api/bookingSummary?year=2030&month=5').get_json()['03-05-2030']['10:00'] == 0
+    assert client.get('/api/admin/schedule', headers=admin_headers).get_json()['rules'] == []
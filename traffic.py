@@ -0,0 +1,158 @@
+import atexit
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+# Opt-in traffic recorder for performance regression testing.
+#
+# With TRAFFIC_RECORD_PATH=/var/log/booking/traffic set, every worker appends
+# one compact JSON line per request to <path>.<pid>.ndjson.gz:
+#   {"ts": 1714000000.123, "m": "POST", "p": "/api/makeBooking", "q": "...",
+#    "b": {...}, "auth": false, "s": 201, "ms": 12.4, "ref": "AbC123"}
+# Personal data never reaches the log: the fields in REDACTED_FIELDS are
+# replaced with stable pseudonyms (the same email always maps to the same fake
+# address, so per-user patterns like OTP bursts survive) and Authorization
+# headers are reduced to a flag. scripts/replay.py plays the logs back.
+#
+# Pseudonyms are HMAC-SHA256 keyed by TRAFFIC_RECORD_SECRET, so they can't be
+# reversed by hashing guessed emails or phone numbers. Without a secret each
+# recorder draws a random key: pseudonyms are then only stable within one
+# worker's recording, not across workers or restarts.
+REDACTED_FIELDS = {'email', 'phone', 'family_name', 'otp', 'password', 'username'}
+# Probes are noise and the SSE stream is long-lived, neither is worth replaying
+SKIPPED_PATHS = {'/healthz', '/readyz', '/api/bookingSummary/stream'}
+MAX_BODY_BYTES = 64 * 1024
+
+
+def pseudonym(field, value, key):
+    digest = hmac.new(key, f"{field}:{value}".encode(), hashlib.sha256).hexdigest()
+    if field == 'email':
+        return f"user-{digest[:12]}@example.invalid"
+    if field == 'phone':
+        return str(int(digest[:12], 16))[:10]
+    if field == 'otp':
+        return '000000'
+    return f"{field}-{digest[:12]}"
+
+
+def redact(value, key, field=None):
+    if isinstance(value, dict):
+        return {k: redact(v, key, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v, key, field) for v in value]
+    if field in REDACTED_FIELDS and value not in (None, ''):
+        return pseudonym(field, value, key)
+    return value
+
+
+def redact_query(query_string, key):
+    return urlencode([(k, redact(v, key, k)) for k, v in parse_qsl(query_string, keep_blank_values=True)])
+
+
+class TrafficRecorder:
+    # WSGI middleware, installed by create_app() when TRAFFIC_RECORD_PATH is set
+    def __init__(self, wsgi_app, path, sample_rate=1.0, secret=None):
+        self.wsgi_app = wsgi_app
+        self.path = path
+        self.sample_rate = sample_rate
+        self.key = secret.encode() if secret else os.urandom(32)
+        self.lock = threading.Lock()
+        self.file = None
+        self.file_pid = None
+        atexit.register(self.close)
+
+    def _open(self):
+        # One file per worker process, so workers never interleave writes
+        if self.file is None or self.file_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = gzip.open(f"{self.path}.{os.getpid()}.ndjson.gz", 'at')
+            self.file_pid = os.getpid()
+        return self.file
+
+    def close(self):
+        with self.lock:
+            if self.file is not None and self.file_pid == os.getpid():
+                self.file.close()
+            self.file = None
+
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.lock:
+            f = self._open()
+            f.write(line)
+            f.flush()
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path in SKIPPED_PATHS or random.random() >= self.sample_rate:
+            return self.wsgi_app(environ, start_response)
+
+        # Read the body once and hand the app a fresh stream
+        body = b''
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if 0 < length <= MAX_BODY_BYTES:
+            body = environ['wsgi.input'].read(length)
+            environ['wsgi.input'] = io.BytesIO(body)
+
+        record = {
+            "ts": round(time.time(), 3),
+            "m": environ.get('REQUEST_METHOD'),
+            "p": path,
+            "q": redact_query(environ.get('QUERY_STRING', ''), self.key),
+            "auth": 'HTTP_AUTHORIZATION' in environ,
+        }
+        if body:
+            try:
+                record["b"] = redact(json.loads(body), self.key)
+            except ValueError:
+                record["b"] = None
+
+        start = time.perf_counter()
+        captured = {}
+
+        def recording_start_response(status, headers, exc_info=None):
+            captured['status'] = int(status.split(' ', 1)[0])
+            captured['json'] = any(k.lower() == 'content-type' and 'application/json' in v for k, v in headers)
+            return start_response(status, headers, exc_info)
+
+        result = self.wsgi_app(environ, recording_start_response)
+        return self._finish(result, record, start, captured)
+
+    def _finish(self, result, record, start, captured):
+        # Wraps the response iterable so latency covers the whole body
+        chunks = []
+        try:
+            for chunk in result:
+                if captured.get('json') and sum(map(len, chunks)) < MAX_BODY_BYTES:
+                    chunks.append(chunk)
+                yield chunk
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            record["s"] = captured.get('status')
+            record["ms"] = round((time.perf_counter() - start) * 1000, 2)
+            if chunks:
+                # Generated booking references let the replay map recorded
+                # references to the ones created during the replay
+                try:
+                    response = json.loads(b''.join(chunks))
+                    if isinstance(response, dict) and 'ref_number' in response:
+                        record["ref"] = response['ref_number']
+                except ValueError:
+                    pass
+            try:
+                self.write(record)
+            except Exception as e:
+                print(f"Error recording traffic: {str(e)}")